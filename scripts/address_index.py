@@ -0,0 +1,62 @@
+#address_index.py
+
+import json
+from pathlib import Path
+
+DATABASE_DIR = Path(__file__).resolve().parent.parent / "database"
+
+
+def normalize_name(name):
+    return name.strip().lower()
+
+
+class AddressIndex:
+    """Settlement and street lookups built once from the naselja/ulice registries."""
+
+    def __init__(self, naselja, ulice):
+        self._settlements_by_name = {}
+        self._zip_by_name = {}
+        for naselje in naselja:
+            key = normalize_name(naselje["NASELJE_NAZIV"])
+            self._settlements_by_name.setdefault(key, []).append(naselje)
+            # First settlement with the name wins, as the linear scan did
+            self._zip_by_name.setdefault(key, str(naselje.get("ZIP", "")))
+
+        streets_by_mbr = {}
+        for ulica in ulice:
+            streets_by_mbr.setdefault(ulica["NASELJE_MBR"], set()).add(ulica["ULICA_NAZIV"])
+        self._streets_by_mbr = {mbr: tuple(sorted(names)) for mbr, names in streets_by_mbr.items()}
+
+        self._streets_by_name = {}
+        self.city_names = tuple(sorted({n["NASELJE_NAZIV"] for n in naselja}))
+
+    @classmethod
+    def from_json(cls, base_path=DATABASE_DIR):
+        base_path = Path(base_path)
+        with open(base_path / "naselja.json", encoding="utf-8") as f:
+            naselja = json.load(f)
+        with open(base_path / "ulice.json", encoding="utf-8") as f:
+            ulice = json.load(f)
+        return cls(naselja, ulice)
+
+    def settlements(self, name):
+        return self._settlements_by_name.get(normalize_name(name), [])
+
+    def zip_code(self, name):
+        return self._zip_by_name.get(normalize_name(name), "")
+
+    def streets(self, name):
+        """Sorted street names of every settlement called `name`."""
+        key = normalize_name(name)
+        streets = self._streets_by_name.get(key)
+        if streets is None:
+            settlements = self._settlements_by_name.get(key, [])
+            if len(settlements) == 1:
+                streets = self._streets_by_mbr.get(settlements[0]["NASELJE_MBR"], ())
+            else:
+                merged = set()
+                for naselje in settlements:
+                    merged.update(self._streets_by_mbr.get(naselje["NASELJE_MBR"], ()))
+                streets = tuple(sorted(merged))
+            self._streets_by_name[key] = streets
+        return streets
@@ -0,0 +1,194 @@
+#address_store.py
+
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+
+from address_index import AddressIndex, normalize_name, DATABASE_DIR
+
+ADDRESS_DB_PATH = DATABASE_DIR / "adrese.sqlite"
+SOURCE_FILES = ("naselja.json", "ulice.json")
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE zupanije (mbr TEXT PRIMARY KEY, naziv TEXT);
+CREATE TABLE opcine (mbr TEXT PRIMARY KEY, naziv TEXT);
+CREATE TABLE naselja (
+    mbr TEXT PRIMARY KEY,
+    naziv TEXT NOT NULL,
+    naziv_norm TEXT NOT NULL,
+    zip TEXT,
+    zupanija_mbr TEXT,
+    grop_mbr TEXT
+);
+CREATE INDEX naselja_naziv_norm ON naselja (naziv_norm);
+CREATE TABLE ulice (naselje_mbr TEXT NOT NULL, naziv TEXT NOT NULL);
+CREATE INDEX ulice_naselje ON ulice (naselje_mbr, naziv);
+"""
+
+
+def _source_mtimes(base_path):
+    return {name: os.stat(Path(base_path) / name).st_mtime_ns for name in SOURCE_FILES}
+
+
+def build_address_store(base_path=DATABASE_DIR, db_path=ADDRESS_DB_PATH):
+    """Import naselja.json and ulice.json into an indexed SQLite file."""
+    base_path = Path(base_path)
+    with open(base_path / "naselja.json", encoding="utf-8") as f:
+        naselja = json.load(f)
+    with open(base_path / "ulice.json", encoding="utf-8") as f:
+        ulice = json.load(f)
+
+    # Per-process temp name, so concurrent imports don't write into the same file
+    tmp_path = f"{db_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        # County and municipality names repeat on every settlement; store each once
+        conn.executemany("INSERT OR IGNORE INTO zupanije VALUES (?, ?)",
+                         ((n["ZUPANIJA_MBR"], n["ZUPANIJA_NAZIV"]) for n in naselja))
+        conn.executemany("INSERT OR IGNORE INTO opcine VALUES (?, ?)",
+                         ((n["GROP_MBR"], n["GROP_NAZIV"]) for n in naselja))
+        conn.executemany("INSERT OR REPLACE INTO naselja VALUES (?, ?, ?, ?, ?, ?)", (
+            (n["NASELJE_MBR"], n["NASELJE_NAZIV"], normalize_name(n["NASELJE_NAZIV"]),
+             str(n.get("ZIP", "")), n["ZUPANIJA_MBR"], n["GROP_MBR"])
+            for n in naselja
+        ))
+        conn.executemany("INSERT INTO ulice VALUES (?, ?)",
+                         ((u["NASELJE_MBR"], u["ULICA_NAZIV"]) for u in ulice))
+
+        try:
+            conn.execute("CREATE VIRTUAL TABLE naselja_fts USING fts5(naziv, content='naselja', content_rowid='rowid')")
+            conn.execute("INSERT INTO naselja_fts(naselja_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError:
+            print("⚠️ SQLite FTS5 not available; settlement search falls back to prefix matching")
+
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", (
+            (f"mtime:{name}", str(mtime)) for name, mtime in _source_mtimes(base_path).items()
+        ))
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    print(f"✅ Address store written: {db_path} ({len(naselja)} naselja, {len(ulice)} ulica)")
+
+
+class AddressStore:
+    """Read-only view over adrese.sqlite with the same lookups as AddressIndex.
+
+    The database is opened on the first query, and only the rows asked for are loaded.
+    """
+
+    def __init__(self, db_path=ADDRESS_DB_PATH):
+        self.db_path = str(db_path)
+        self._conn = None
+        self._lock = threading.Lock()
+        self._city_names = None
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            if self._conn is None:
+                uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+                self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            return self._conn.execute(sql, params).fetchall()
+
+    def is_current(self, base_path=DATABASE_DIR):
+        """True if the store was built from the current JSON registries."""
+        try:
+            stored = dict(self._query("SELECT key, value FROM meta"))
+        except sqlite3.Error:
+            return False
+        for name in SOURCE_FILES:
+            source = Path(base_path) / name
+            # A store shipped without its JSON sources is authoritative
+            if source.exists() and stored.get(f"mtime:{name}") != str(source.stat().st_mtime_ns):
+                return False
+        return True
+
+    @property
+    def city_names(self):
+        if self._city_names is None:
+            self._city_names = tuple(r[0] for r in self._query("SELECT DISTINCT naziv FROM naselja ORDER BY naziv"))
+        return self._city_names
+
+    def settlements(self, name):
+        rows = self._query(
+            "SELECT n.mbr, n.naziv, n.zip, n.zupanija_mbr, z.naziv, n.grop_mbr, o.naziv "
+            "FROM naselja n LEFT JOIN zupanije z ON z.mbr = n.zupanija_mbr "
+            "LEFT JOIN opcine o ON o.mbr = n.grop_mbr WHERE n.naziv_norm = ? ORDER BY n.rowid",
+            (normalize_name(name),))
+        return [{
+            "NASELJE_MBR": r[0], "NASELJE_NAZIV": r[1], "ZIP": r[2],
+            "ZUPANIJA_MBR": r[3], "ZUPANIJA_NAZIV": r[4], "GROP_MBR": r[5], "GROP_NAZIV": r[6],
+        } for r in rows]
+
+    def zip_code(self, name):
+        rows = self._query("SELECT zip FROM naselja WHERE naziv_norm = ? ORDER BY rowid LIMIT 1",
+                           (normalize_name(name),))
+        return rows[0][0] if rows else ""
+
+    def streets(self, name):
+        rows = self._query(
+            "SELECT DISTINCT u.naziv FROM ulice u JOIN naselja n ON n.mbr = u.naselje_mbr "
+            "WHERE n.naziv_norm = ? ORDER BY u.naziv",
+            (normalize_name(name),))
+        return tuple(r[0] for r in rows)
+
+    def search(self, text, limit=20):
+        """Settlement names matching `text`, using the FTS index when it exists."""
+        text = text.strip()
+        if not text:
+            return []
+        try:
+            query = " ".join(f'"{word}"*' for word in text.replace('"', "").split())
+            rows = self._query(
+                "SELECT DISTINCT naziv FROM naselja_fts WHERE naselja_fts MATCH ? ORDER BY rank LIMIT ?",
+                (query, limit))
+        except sqlite3.OperationalError:
+            rows = self._query(
+                "SELECT DISTINCT naziv FROM naselja WHERE naziv_norm LIKE ? ORDER BY naziv LIMIT ?",
+                (normalize_name(text) + "%", limit))
+        return [r[0] for r in rows]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def load_addresses(base_path=DATABASE_DIR, db_path=ADDRESS_DB_PATH):
+    """Open the SQLite store when it's current, otherwise index the JSON registries."""
+    if os.path.exists(db_path):
+        store = AddressStore(db_path)
+        if store.is_current(base_path):
+            return store
+        store.close()
+        print("⚠️ Address store is older than the JSON registries; run `address_store.py import`")
+    return AddressIndex.from_json(base_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the compact address store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_cmd = sub.add_parser("import", help="build adrese.sqlite from naselja.json and ulice.json")
+    import_cmd.add_argument("--source", default=str(DATABASE_DIR))
+    import_cmd.add_argument("--db", default=str(ADDRESS_DB_PATH))
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        build_address_store(args.source, args.db)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
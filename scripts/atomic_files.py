@@ -0,0 +1,68 @@
+#atomic_files.py
+
+import os
+import errno
+import shutil
+import tempfile
+from pathlib import Path
+from contextlib import contextmanager
+
+
+def _temp_path(dest):
+    # Next to the destination, so the final os.replace is a rename on one filesystem
+    dest = Path(dest)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{dest.name}.", suffix=".tmp", dir=dest.parent)
+    os.close(fd)
+    return tmp_path
+
+
+def _discard(tmp_path):
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+
+@contextmanager
+def atomic_open(dest, mode="w", sync=True, **kwargs):
+    """Open a temp file that replaces `dest` only once it has been written completely.
+
+    Readers and concurrent writers see either the old file or the new one, never a mix.
+    """
+    tmp_path = _temp_path(dest)
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, dest)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+
+
+def atomic_copy(src, dest, sync=True):
+    tmp_path = _temp_path(dest)
+    try:
+        shutil.copyfile(src, tmp_path)
+        if sync:
+            with open(tmp_path, "rb") as f:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, dest)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    return dest
+
+
+def atomic_move(src, dest, sync=True):
+    """Move `src` to `dest` atomically, copying first when they're on different filesystems."""
+    try:
+        os.replace(src, dest)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        atomic_copy(src, dest, sync)
+        os.remove(src)
+    return dest
@@ -0,0 +1,317 @@
+#batch_generator.py
+
+import os
+import csv
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utilis import (
+    round_down_hour,
+    render_odt_template,
+    render_native_pdf,
+    claim_invoice_number,
+    release_invoice_number,
+    build_invoice_context,
+    OUTPUT_DIR,
+    TEMPLATE_PATH,
+    PDF_BACKENDS,
+    DEFAULT_PDF_BACKEND,
+    get_render_cache,
+    output_cache_dir,
+    render_cache_key
+)
+from invoice_archive import archive_invoice
+from soffice_pool import SofficePool, get_conversion_pool
+from instrumentation import stage, set_quiet, configure_logging, METRICS
+
+CLIENT_FIELDS = ("client_name", "oib", "address", "postal_code", "city")
+# CSV columns that belong to the row's item rather than to its invoice
+CSV_ITEM_COLUMNS = ("item_name", "quantity", "unit_price", "vat_rate")
+DATE_FORMATS = ("%d.%m.%Y", "%Y-%m-%d", "%d/%m/%y")
+
+
+def parse_date(text, default=None):
+    if not text:
+        return default
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text.strip(), fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {text}")
+
+
+def parse_date_time(text):
+    if not text:
+        return None
+    return datetime.strptime(text.strip(), "%H:%M").time()
+
+
+def load_invoices(path):
+    """Read invoices from a JSONL file (one invoice per line) or a CSV file (one item per row)."""
+    if path.lower().endswith(".csv"):
+        return _load_invoices_csv(path)
+
+    invoices = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                invoices.append(json.loads(line))
+    return invoices
+
+
+def _load_invoices_csv(path):
+    # Rows belonging to the same invoice share an invoice_number, or client and date when unnumbered
+    invoices = {}
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            key = row.get("invoice_number") or (row.get("client_name"), row.get("invoice_date"))
+            invoice = invoices.get(key)
+            if invoice is None:
+                invoice = {k: v for k, v in row.items() if k not in CSV_ITEM_COLUMNS}
+                invoice["items"] = []
+                invoices[key] = invoice
+            item = {
+                "name": row["item_name"],
+                "quantity": row["quantity"],
+                "unit_price": row["unit_price"],
+            }
+            # An empty vat_rate cell means the default rate
+            if row.get("vat_rate"):
+                item["vat_rate"] = row["vat_rate"]
+            invoice["items"].append(item)
+    return list(invoices.values())
+
+
+def prepare_context(invoice, invoice_number):
+    now = round_down_hour(datetime.now())
+    invoice_date = parse_date(invoice.get("invoice_date"), now)
+    invoice_time = parse_date_time(invoice.get("invoice_time")) or now.time()
+    due_date = parse_date(invoice.get("due_date"))
+
+    client = {field: str(invoice.get(field, "") or "") for field in CLIENT_FIELDS}
+    context = build_invoice_context(
+        client, invoice["items"], invoice_number, invoice_date,
+        invoice_time=invoice_time, due_date=due_date,
+        invoice_type=invoice.get("invoice_type", ""),
+        location=invoice.get("location") or "Rijeka",
+    )
+    return context, invoice_date
+
+
+def _render_job(template_path, odt_path, context, cache_dir):
+    # Runs in a worker process; returns the render time so the parent can report it
+    started = time.perf_counter()
+    ok = render_odt_template(template_path, odt_path, context, cache_dir=cache_dir)
+    return ok, time.perf_counter() - started
+
+
+def _render_native_job(pdf_path, context):
+    started = time.perf_counter()
+    ok = render_native_pdf(context, pdf_path)
+    return ok, time.perf_counter() - started
+
+
+def _archive_job(job, pdf_path, odt_path, output_dir, cache=None):
+    record = job["record"]
+    try:
+        if cache is not None and not record.get("cached"):
+            cache.put(job["cache_key"], pdf_path, odt_path)
+        with stage("archive", invoice_number=job["context"]["invoice_number"]):
+            final_pdf_path = archive_invoice(job["context"], job["invoice_date"], pdf_path, odt_path, output_dir)
+        record.update(status="ok", pdf_path=str(final_pdf_path))
+    except Exception as e:
+        record.update(status="error", stage="archive", error=str(e))
+
+
+def generate_batch(invoices, output_dir=OUTPUT_DIR, template_path=TEMPLATE_PATH,
+                   render_workers=None, convert_workers=None, backend=None, use_cache=True):
+    """Render, convert and archive many invoices with overlapping stages.
+
+    With the native backend the render workers write PDFs directly and the
+    LibreOffice stage is skipped. Invoices already in the render cache go
+    straight to archival.
+
+    Returns a list of per-invoice result records and a summary dict.
+    """
+    started = time.perf_counter()
+    results = []
+    jobs = []
+
+    # Allocate invoice numbers up front so parallel stages never race for them
+    for index, invoice in enumerate(invoices):
+        record = {"index": index, "client_name": invoice.get("client_name", ""), "status": "pending"}
+        results.append(record)
+        try:
+            invoice_number = invoice.get("invoice_number")
+            context, invoice_date = prepare_context(invoice, invoice_number)
+        except (KeyError, ValueError) as e:
+            record.update(status="error", stage="prepare", error=str(e))
+            continue
+
+        invoice_number = claim_invoice_number(output_dir, invoice_date.strftime("%Y"), invoice_number)
+        context["invoice_number"] = invoice_number
+
+        record["invoice_number"] = invoice_number
+        scratch_dir = tempfile.mkdtemp(prefix="billio-batch-")
+        jobs.append({
+            "record": record,
+            "context": context,
+            "invoice_date": invoice_date,
+            "scratch_dir": scratch_dir,
+            "odt_path": os.path.join(scratch_dir, "invoice.odt"),
+            "pdf_path": os.path.join(scratch_dir, "invoice.pdf"),
+        })
+
+    backend = backend or DEFAULT_PDF_BACKEND
+    native = backend == "native"
+    cache = get_render_cache(output_dir) if use_cache else None
+
+    pending = []
+    for job in jobs:
+        if cache is not None:
+            job["cache_key"] = render_cache_key(job["context"], backend, template_path)
+            odt_path = None if native else job["odt_path"]
+            if cache.get(job["cache_key"], job["pdf_path"], odt_path):
+                job["record"]["cached"] = True
+                _archive_job(job, job["pdf_path"], odt_path, output_dir)
+                continue
+        pending.append(job)
+
+    pool = None
+    conversions = {}
+
+    try:
+        if pending and not native:
+            try:
+                pool = SofficePool(size=convert_workers) if convert_workers else get_conversion_pool()
+            except Exception as e:
+                # Without a converter none of them can be finished; each one reports why
+                for job in pending:
+                    job["record"].update(status="error", stage="convert", error=str(e))
+                pending = []
+
+        with ProcessPoolExecutor(max_workers=render_workers) as render_pool:
+            if native:
+                renders = {
+                    render_pool.submit(_render_native_job, job["pdf_path"], job["context"]): job
+                    for job in pending
+                }
+            else:
+                renders = {
+                    render_pool.submit(_render_job, template_path, job["odt_path"], job["context"],
+                                       output_cache_dir(output_dir, "jinja")): job
+                    for job in pending
+                }
+
+            # Each rendered ODT goes straight to a soffice worker while others are still rendering
+            for future in as_completed(renders):
+                job = renders[future]
+                record = job["record"]
+                try:
+                    ok, record["render_s"] = future.result()
+                    # The worker process's own metrics never reach this process; record its timing here
+                    METRICS.observe("render_native" if native else "render_odt", record["render_s"],
+                                    "ok" if ok else "error")
+                except Exception as e:
+                    ok = False
+                    record["error"] = str(e)
+                if not ok:
+                    record.update(status="error", stage="render")
+                    record.setdefault("error", "template rendering failed")
+                    continue
+                if native:
+                    _archive_job(job, job["pdf_path"], None, output_dir, cache)
+                    continue
+                job["convert_started"] = time.perf_counter()
+                conversions[pool.submit(job["odt_path"], job["scratch_dir"])] = job
+
+        for future in as_completed(conversions):
+            job = conversions[future]
+            record = job["record"]
+            record["convert_s"] = time.perf_counter() - job["convert_started"]
+            try:
+                pdf_path = future.result()
+            except Exception as e:
+                record.update(status="error", stage="convert", error=str(e))
+                continue
+            _archive_job(job, pdf_path, job["odt_path"], output_dir, cache)
+    finally:
+        if pool is not None and convert_workers:
+            pool.shutdown()
+        for job in jobs:
+            shutil.rmtree(job["scratch_dir"], ignore_errors=True)
+            # Invoices that never reached the archive give their number back
+            record = job["record"]
+            if record["status"] != "ok" and record.get("stage") != "archive":
+                release_invoice_number(output_dir, job["invoice_date"].strftime("%Y"), record["invoice_number"])
+
+    elapsed = time.perf_counter() - started
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    summary = {
+        "total": len(results),
+        "succeeded": succeeded,
+        "cached": sum(1 for r in results if r.get("cached")),
+        "failed": len(results) - succeeded,
+        "elapsed_s": round(elapsed, 3),
+        "invoices_per_s": round(succeeded / elapsed, 3) if elapsed else 0.0,
+    }
+    return results, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate many invoices from a CSV or JSONL file.")
+    parser.add_argument("input", help="JSONL (one invoice per line) or CSV (one item per row)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--template", default=TEMPLATE_PATH)
+    parser.add_argument("--render-workers", type=int, default=None)
+    parser.add_argument("--convert-workers", type=int, default=None)
+    parser.add_argument("--backend", choices=PDF_BACKENDS, default=DEFAULT_PDF_BACKEND,
+                        help="native skips LibreOffice and lays the PDF out in-process")
+    parser.add_argument("--no-cache", action="store_true", help="always render, ignoring the render cache")
+    parser.add_argument("--report", help="write per-invoice result records as JSONL")
+    parser.add_argument("--quiet", action="store_true", help="only print failures and the summary")
+    parser.add_argument("--log-file", help="write structured JSON stage events here ('-' for stderr)")
+    parser.add_argument("--metrics-file", help="write Prometheus metrics here when the batch finishes")
+    args = parser.parse_args(argv)
+
+    if args.quiet:
+        os.environ["BILLIO_QUIET"] = "1"  # inherited by the render worker processes
+        set_quiet(True)
+    if args.log_file:
+        os.environ["BILLIO_LOG_FILE"] = args.log_file
+        configure_logging(args.log_file)
+
+    invoices = load_invoices(args.input)
+    print(f"🚀 Generating {len(invoices)} invoices from {args.input}")
+
+    results, summary = generate_batch(
+        invoices, args.output_dir, args.template, args.render_workers, args.convert_workers, args.backend,
+        use_cache=not args.no_cache)
+
+    for record in results:
+        if record["status"] != "ok":
+            print(f"   ❌ #{record['index']} {record['client_name']}: {record.get('stage')} - {record.get('error')}")
+
+    if args.metrics_file:
+        METRICS.write_textfile(args.metrics_file)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            for record in results:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    print(f"✅ {summary['succeeded']}/{summary['total']} invoices in {summary['elapsed_s']} s "
+          f"({summary['invoices_per_s']} invoices/s)")
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+#benchmark.py
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from utilis import (
+    BASE_DIR,
+    TEMPLATE_PATH,
+    allocate_invoice_number,
+    build_invoice_context,
+    convert_to_pdf,
+    render_native_pdf,
+    render_odt_template
+)
+import utilis
+from invoice_archive import archive_invoice, write_invoice_record
+from address_index import AddressIndex
+from address_store import AddressStore, build_address_store
+from instrumentation import set_quiet
+
+DEFAULT_OUTPUT = os.path.join(BASE_DIR, "bench_output.txt")
+CONVERTERS = ("stub", "libreoffice", "native")
+
+# Smallest valid one-page PDF; the stub converter writes it in place of a LibreOffice run
+STUB_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 595 842]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+
+
+def parse_sizes(text):
+    return [int(size) for size in text.split(",") if size.strip()]
+
+
+def synthetic_client(n):
+    return {
+        "client_name": f"Klijent {n} d.o.o.",
+        "oib": f"{10000000000 + n}",
+        "address": f"Ulica {n % 97} {n % 13 + 1}",
+        "postal_code": "51000",
+        "city": "Rijeka",
+    }
+
+
+def synthetic_items(count):
+    # Raw strings as typed into the GUI, so parsing is part of the collect stage
+    return [{
+        "name": f"Stavka {i} - usluga održavanja",
+        "quantity": f"{i % 5 + 1},00",
+        "unit_price": f"{(i * 37) % 1000 + 10},50",
+    } for i in range(count)]
+
+
+def stub_convert(odt_path, output_dir):
+    # Same contract as convert_to_pdf: writes <odt stem>.pdf into output_dir, returns success
+    with open(os.path.join(output_dir, Path(odt_path).stem + ".pdf"), "wb") as f:
+        f.write(STUB_PDF)
+    return True
+
+
+class StageTimer:
+    """Collects wall-clock samples per stage name."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def time(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+        return result
+
+    def results(self, suite, size, **extra):
+        rows = []
+        for stage, samples in self.samples.items():
+            rows.append({
+                "suite": suite,
+                "size": size,
+                "stage": stage,
+                "runs": len(samples),
+                "total_s": round(sum(samples), 6),
+                "mean_s": round(statistics.fmean(samples), 6),
+                "median_s": round(statistics.median(samples), 6),
+                "min_s": round(min(samples), 6),
+                "max_s": round(max(samples), 6),
+                **extra,
+            })
+        return rows
+
+
+def run_pipeline(timer, client, items, invoice_number, output_dir, scratch_dir, converter, template_path):
+    """One invoice through collect -> render -> convert -> journal -> archive."""
+    invoice_date = datetime(2025, 6, 2, 10, 0)
+    context = timer.time("collect", build_invoice_context, client, items, invoice_number, invoice_date)
+    odt_path = os.path.join(scratch_dir, "invoice.odt")
+
+    if converter == "native":
+        pdf_path = os.path.join(scratch_dir, "invoice.pdf")
+        if not timer.time("render_native", render_native_pdf, context, pdf_path):
+            raise RuntimeError("native render failed")
+        odt_path = None
+    else:
+        if not timer.time("render", render_odt_template, template_path, odt_path, context):
+            raise RuntimeError("ODT render failed")
+        convert = stub_convert if converter == "stub" else convert_to_pdf
+        if not timer.time("convert", convert, odt_path, scratch_dir):
+            raise RuntimeError("PDF conversion failed")
+        # The converter names the PDF after the ODT
+        pdf_path = os.path.join(scratch_dir, "invoice.pdf")
+
+    # The journal write is timed on its own in a throwaway tree; the archive stage below writes its own
+    timer.time("journal", write_invoice_record, context, "2025", os.path.join(scratch_dir, "journal"))
+    timer.time("archive", archive_invoice, context, invoice_date, pdf_path, odt_path, output_dir)
+
+
+def bench_items(sizes, repeat, converter, template_path, work_dir):
+    """One invoice with a growing number of line items."""
+    rows = []
+    for size in sizes:
+        timer = StageTimer()
+        items = synthetic_items(size)
+        for run in range(repeat):
+            output_dir = os.path.join(work_dir, f"items-{size}-{run}")
+            scratch_dir = tempfile.mkdtemp(dir=work_dir)
+            run_pipeline(timer, synthetic_client(run), items, f"{run + 1}/1/1",
+                         output_dir, scratch_dir, converter, template_path)
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+        rows += timer.results("items", size)
+        print(f"⏱️ {size} items: {_summary(timer)}")
+    return rows
+
+
+def bench_invoices(sizes, items_per_invoice, converter, template_path, work_dir):
+    """Many invoices archived into one output tree, as a busy year would be."""
+    rows = []
+    for size in sizes:
+        timer = StageTimer()
+        output_dir = os.path.join(work_dir, f"invoices-{size}")
+        items = synthetic_items(items_per_invoice)
+        start = time.perf_counter()
+        for n in range(size):
+            number = timer.time("number", allocate_invoice_number, output_dir, "2025")
+            scratch_dir = tempfile.mkdtemp(dir=work_dir)
+            run_pipeline(timer, synthetic_client(n), items, f"{number}/2/2",
+                         output_dir, scratch_dir, converter, template_path)
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+        elapsed = time.perf_counter() - start
+        rows += timer.results("invoices", size, invoices_per_s=round(size / elapsed, 2) if elapsed else None)
+        print(f"⏱️ {size} invoices in {elapsed:.2f}s: {_summary(timer)}")
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return rows
+
+
+def synthetic_addresses(settlements, streets_per_settlement=20):
+    naselja, ulice = [], []
+    for n in range(settlements):
+        mbr = f"{n:06d}"
+        naselja.append({
+            "NASELJE_MBR": mbr,
+            "NASELJE_NAZIV": f"Naselje {n % (settlements // 2 or 1)}",  # duplicate names, as the real registry has
+            "ZIP": 10000 + n % 900,
+            "ZUPANIJA_MBR": f"{n % 21:02d}",
+            "ZUPANIJA_NAZIV": f"Županija {n % 21}",
+            "GROP_MBR": f"{n % 556:05d}",
+            "GROP_NAZIV": f"Općina {n % 556}",
+        })
+        ulice += [{"NASELJE_MBR": mbr, "ULICA_NAZIV": f"Ulica {s}"} for s in range(streets_per_settlement)]
+    return naselja, ulice
+
+
+def bench_addresses(sizes, lookups, work_dir):
+    """Loading and querying the JSON index and the SQLite store for large registries."""
+    rows = []
+    for size in sizes:
+        timer = StageTimer()
+        base = Path(work_dir) / f"addresses-{size}"
+        base.mkdir(parents=True, exist_ok=True)
+        naselja, ulice = synthetic_addresses(size)
+        with open(base / "naselja.json", "w", encoding="utf-8") as f:
+            json.dump(naselja, f, ensure_ascii=False)
+        with open(base / "ulice.json", "w", encoding="utf-8") as f:
+            json.dump(ulice, f, ensure_ascii=False)
+
+        index = timer.time("json_load", AddressIndex.from_json, base)
+        db_path = base / "adrese.sqlite"
+        timer.time("sqlite_import", build_address_store, base, db_path)
+        store = AddressStore(db_path)
+        names = [f"Naselje {(n * 7919) % (size // 2 or 1)}" for n in range(lookups)]
+        for name in names:
+            timer.time("json_lookup", lambda: (index.zip_code(name), index.streets(name)))
+            timer.time("sqlite_lookup", lambda: (store.zip_code(name), store.streets(name)))
+            timer.time("sqlite_search", store.search, name[:8])
+        store.close()
+        rows += timer.results("addresses", size)
+        print(f"⏱️ {size} settlements: {_summary(timer)}")
+        shutil.rmtree(base, ignore_errors=True)
+    return rows
+
+
+def _summary(timer):
+    return ", ".join(f"{stage} {statistics.median(s) * 1000:.2f}ms" for stage, s in timer.samples.items())
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(previous_path, results):
+    """Print median changes against an earlier results file."""
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {(r["suite"], r["size"], r["stage"]): r for r in json.load(f)["results"]}
+    print(f"📊 Compared with {previous_path}:")
+    for row in results:
+        old = previous.get((row["suite"], row["size"], row["stage"]))
+        if old and old["median_s"]:
+            change = row["median_s"] / old["median_s"] - 1
+            print(f"   {row['suite']:<9} {row['size']:>6} {row['stage']:<14} "
+                  f"{old['median_s'] * 1000:9.2f}ms -> {row['median_s'] * 1000:9.2f}ms ({change:+.0%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each invoice pipeline stage on synthetic workloads.")
+    parser.add_argument("--items", default="1,10,100,1000", help="line item counts for the items suite")
+    parser.add_argument("--invoices", default="1,10,100", help="invoice counts for the invoices suite")
+    parser.add_argument("--addresses", default="1000,10000", help="settlement counts for the addresses suite")
+    parser.add_argument("--suites", default="items,invoices,addresses")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per size in the items suite")
+    parser.add_argument("--items-per-invoice", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=200, help="queries per size in the addresses suite")
+    parser.add_argument("--converter", choices=CONVERTERS, default="stub",
+                        help="stub skips LibreOffice so the benchmark runs headless anywhere")
+    parser.add_argument("--template", default=TEMPLATE_PATH)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON results file")
+    parser.add_argument("--compare", help="earlier results file to compare medians against")
+    args = parser.parse_args(argv)
+
+    # Per-invoice console messages would be timed along with the stages
+    set_quiet(True)
+    suites = {s.strip() for s in args.suites.split(",")}
+    work_dir = tempfile.mkdtemp(prefix="billio-bench-")
+    # Keep the template bytecode cache out of the real output/ tree
+    utilis.JINJA_CACHE_DIR = os.path.join(work_dir, "jinja")
+    results = []
+    try:
+        if "items" in suites:
+            results += bench_items(parse_sizes(args.items), args.repeat, args.converter, args.template, work_dir)
+        if "invoices" in suites:
+            results += bench_invoices(parse_sizes(args.invoices), args.items_per_invoice,
+                                      args.converter, args.template, work_dir)
+        if "addresses" in suites:
+            results += bench_addresses(parse_sizes(args.addresses), args.lookups, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "converter": args.converter,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Benchmark results written: {args.output}")
+
+    if args.compare:
+        compare(args.compare, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
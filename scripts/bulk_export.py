@@ -0,0 +1,217 @@
+#bulk_export.py
+
+import io
+import os
+import csv
+import sys
+import shutil
+import argparse
+import calendar
+import tempfile
+import zipfile
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from utilis import (
+    OUTPUT_DIR,
+    TEMPLATE_PATH,
+    PDF_BACKENDS,
+    DEFAULT_PDF_BACKEND,
+    format_currency,
+    render_invoice_pdf
+)
+from invoice_archive import ensure_index, load_invoice_context, rebuild_index, search_invoices
+from atomic_files import atomic_move, atomic_open
+
+# pypdf is optional; qpdf or pdfunite are used first when installed
+try:
+    from pypdf import PdfWriter
+    HAS_PYPDF = True
+except ImportError:
+    HAS_PYPDF = False
+
+EXPORT_FORMATS = ("pdf", "zip")
+# Files per qpdf/pdfunite call, to stay under the command-line length limit
+MERGE_CHUNK = 200
+SUMMARY_COLUMNS = ("invoice_number", "invoice_date", "client_name", "oib", "total")
+
+
+class ExportError(Exception):
+    pass
+
+
+def month_range(month):
+    """'2025-03' -> ('2025-03-01', '2025-03-31')."""
+    year, month_num = (int(part) for part in month.split("-"))
+    last_day = calendar.monthrange(year, month_num)[1]
+    return f"{year:04d}-{month_num:02d}-01", f"{year:04d}-{month_num:02d}-{last_day:02d}"
+
+
+def select_invoices(date_from=None, date_to=None, client=None, year=None, output_dir=OUTPUT_DIR):
+    """Archived invoices in the period, oldest first."""
+    ensure_index(output_dir)
+    rows = search_invoices(text=client, year=year, date_from=date_from, date_to=date_to,
+                           limit=-1, output_dir=output_dir)
+    rows.reverse()
+    return rows
+
+
+def _restore_pdf(row, backend, template_path, output_dir):
+    """Render an invoice whose PDF is missing from its stored context and put it back in the archive."""
+    context = load_invoice_context(row)
+    scratch_dir = tempfile.mkdtemp(prefix="billio-export-")
+    try:
+        rendered = render_invoice_pdf(context, scratch_dir, backend, template_path, cache_root=output_dir)
+        if rendered is None:
+            raise ExportError(f"Could not render {row['invoice_number']}")
+        Path(row["pdf_path"]).parent.mkdir(parents=True, exist_ok=True)
+        atomic_move(rendered[0], row["pdf_path"])
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return row
+
+
+def restore_missing_pdfs(rows, backend=DEFAULT_PDF_BACKEND, template_path=TEMPLATE_PATH, workers=None,
+                         output_dir=OUTPUT_DIR):
+    """Re-render, in parallel, every selected invoice whose PDF no longer exists."""
+    missing = [row for row in rows if not os.path.exists(row["pdf_path"])]
+    if not missing:
+        return 0
+    unrenderable = [row for row in missing if not row["data_path"] or not os.path.exists(row["data_path"])]
+    if unrenderable:
+        raise ExportError("No PDF or invoice data for: " + ", ".join(r["invoice_number"] for r in unrenderable))
+
+    print(f"🔄 Rendering {len(missing)} missing PDFs")
+    with ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1)) as executor:
+        for row in executor.map(lambda r: _restore_pdf(r, backend, template_path, output_dir), missing):
+            print(f"   ✅ {row['invoice_number']} - {row['client_name']}")
+    return len(missing)
+
+
+def _merge_tool():
+    for tool in ("qpdf", "pdfunite"):
+        path = shutil.which(tool)
+        if path:
+            return tool, path
+    if HAS_PYPDF:
+        return "pypdf", None
+    raise ExportError("Merging PDFs needs qpdf, pdfunite (poppler-utils) or the pypdf package; "
+                      "use --format zip instead")
+
+
+def _merge_with(tool, binary, pdf_paths, output_path):
+    if tool == "qpdf":
+        cmd = [binary, "--empty", "--pages", *pdf_paths, "--", output_path]
+    else:
+        cmd = [binary, *pdf_paths, output_path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    # qpdf exits with 3 for warnings that still produce a valid file
+    ok_codes = (0, 3) if tool == "qpdf" else (0,)
+    if result.returncode not in ok_codes:
+        raise ExportError(f"{tool} failed: {result.stderr.strip()}")
+
+
+def merge_pdfs(pdf_paths, output_path):
+    """Concatenate PDFs into one file.
+
+    qpdf and pdfunite read the inputs one at a time; long lists are merged in
+    chunks and the chunks merged again. The pypdf fallback keeps the merged
+    pages in memory until the file is written.
+    """
+    tool, binary = _merge_tool()
+    if tool == "pypdf":
+        writer = PdfWriter()
+        for path in pdf_paths:
+            writer.append(str(path))
+        with atomic_open(output_path, "wb") as f:
+            writer.write(f)
+        writer.close()
+        return tool
+
+    with tempfile.TemporaryDirectory(prefix="billio-merge-") as scratch_dir:
+        paths = [str(path) for path in pdf_paths]
+        level = 0
+        while len(paths) > MERGE_CHUNK:
+            chunks = []
+            for start in range(0, len(paths), MERGE_CHUNK):
+                chunk_path = os.path.join(scratch_dir, f"{level}-{start}.pdf")
+                _merge_with(tool, binary, paths[start:start + MERGE_CHUNK], chunk_path)
+                chunks.append(chunk_path)
+            paths, level = chunks, level + 1
+        merged_path = os.path.join(scratch_dir, "merged.pdf")
+        if len(paths) == 1:
+            shutil.copyfile(paths[0], merged_path)
+        else:
+            _merge_with(tool, binary, paths, merged_path)
+        atomic_move(merged_path, output_path)
+    return tool
+
+
+def write_zip(rows, output_path):
+    """Add each PDF to a ZIP as it's read, plus a popis.csv summary of the period."""
+    with atomic_open(output_path, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as zf:
+        for row in rows:
+            zf.write(row["pdf_path"], arcname=f"{row['year']}/{os.path.basename(row['pdf_path'])}")
+        # utf-8-sig so spreadsheet programs pick up the Croatian characters
+        with io.TextIOWrapper(zf.open("popis.csv", "w"), encoding="utf-8-sig", newline="") as text:
+            writer = csv.writer(text, delimiter=";")
+            writer.writerow(SUMMARY_COLUMNS)
+            for row in rows:
+                writer.writerow([row["invoice_number"], row["invoice_date"] or "", row["client_name"],
+                                 row["oib"] or "", format_currency(row["total"] or 0)])
+
+
+def export_invoices(output_path, date_from=None, date_to=None, client=None, year=None, export_format=None,
+                    output_dir=OUTPUT_DIR, backend=DEFAULT_PDF_BACKEND, template_path=TEMPLATE_PATH, workers=None):
+    """Export the selected invoices as one merged PDF or a ZIP. Returns the number exported."""
+    export_format = export_format or ("zip" if str(output_path).lower().endswith(".zip") else "pdf")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    rows = select_invoices(date_from, date_to, client, year, output_dir)
+    if not rows:
+        raise ExportError("No invoices match the selection")
+    restore_missing_pdfs(rows, backend, template_path, workers, output_dir)
+
+    if export_format == "zip":
+        write_zip(rows, output_path)
+    else:
+        tool = merge_pdfs([row["pdf_path"] for row in rows], output_path)
+        print(f"📎 Merged with {tool}")
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a period's invoices as one PDF or a ZIP.")
+    parser.add_argument("output", help="merged .pdf or .zip to write")
+    parser.add_argument("--month", help="YYYY-MM; shorthand for --from/--to")
+    parser.add_argument("--year")
+    parser.add_argument("--from", dest="date_from", help="YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", help="YYYY-MM-DD")
+    parser.add_argument("--client", help="client name (substring) or invoice number prefix")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="default: from the output file extension")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--backend", choices=PDF_BACKENDS, default=DEFAULT_PDF_BACKEND,
+                        help="used to re-render invoices whose PDF is missing")
+    parser.add_argument("--template", default=TEMPLATE_PATH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rescan", action="store_true", help="re-index the invoice journals first")
+    args = parser.parse_args(argv)
+
+    date_from, date_to = month_range(args.month) if args.month else (args.date_from, args.date_to)
+    if args.rescan:
+        rebuild_index(args.output_dir)
+
+    try:
+        count = export_invoices(args.output, date_from, date_to, args.client, args.year, args.format,
+                                args.output_dir, args.backend, args.template, args.workers)
+    except ExportError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ Exported {count} invoices to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#client_store.py
+
+import os
+import json
+import bisect
+from pathlib import Path
+
+from address_index import normalize_name, DATABASE_DIR
+from atomic_files import atomic_open
+
+CLIENTS_PATH = DATABASE_DIR / "klijenti.json"
+# Journal entries are folded back into klijenti.json once there are this many
+COMPACT_THRESHOLD = 200
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ClientStore:
+    """Saved clients with name, OIB, prefix and trigram indexes.
+
+    klijenti.json holds a snapshot; new or changed clients are appended to
+    klijenti.journal.jsonl and merged into the snapshot on compaction.
+    """
+
+    def __init__(self, path=CLIENTS_PATH):
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix(".journal.jsonl")
+        self.clients = []
+        self._by_name = {}
+        self._by_oib = {}
+        self._sorted_names = []  # (normalized name, position in self.clients)
+        self._trigrams = {}
+        self._journal_entries = 0
+        self.load()
+
+    def load(self):
+        clients = []
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                clients = json.load(f)
+
+        self.clients = []
+        self._by_name, self._by_oib, self._sorted_names, self._trigrams = {}, {}, [], {}
+        for client in clients:
+            self._upsert(client)
+
+        self._journal_entries = 0
+        if self.journal_path.exists():
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._upsert(json.loads(line))
+                        self._journal_entries += 1
+                    except ValueError:
+                        break  # torn last line from an interrupted write
+
+        if self._journal_entries >= COMPACT_THRESHOLD:
+            self.compact()
+
+    def _upsert(self, client):
+        key = normalize_name(client["client_name"])
+        position = self._by_name.get(key)
+        if position is None:
+            position = len(self.clients)
+            self.clients.append(client)
+            bisect.insort(self._sorted_names, (key, position))
+            for gram in trigrams(key):
+                self._trigrams.setdefault(gram, set()).add(position)
+        else:
+            old_oib = self.clients[position].get("oib")
+            if old_oib and self._by_oib.get(old_oib) == position:
+                del self._by_oib[old_oib]
+            self.clients[position] = client
+
+        self._by_name[key] = position
+        if client.get("oib"):
+            self._by_oib[client["oib"]] = position
+        return position
+
+    def __len__(self):
+        return len(self.clients)
+
+    def names(self):
+        return [client["client_name"] for client in self.clients]
+
+    def find_by_name(self, name):
+        position = self._by_name.get(normalize_name(name))
+        return self.clients[position] if position is not None else None
+
+    def find_by_oib(self, oib):
+        position = self._by_oib.get(oib.strip())
+        return self.clients[position] if position is not None else None
+
+    def complete(self, text, limit=20):
+        """Client names starting with `text`, topped up with fuzzy trigram matches."""
+        key = normalize_name(text)
+        if not key:
+            return []
+
+        results = []
+        start = bisect.bisect_left(self._sorted_names, (key,))
+        for name_key, position in self._sorted_names[start:]:
+            if not name_key.startswith(key) or len(results) >= limit:
+                break
+            results.append(position)
+
+        if len(results) < limit and len(key) >= 3:
+            query = trigrams(key)
+            scores = {}
+            for gram in query:
+                for position in self._trigrams.get(gram, ()):
+                    scores[position] = scores.get(position, 0) + 1
+            # Require at least half of the query's trigrams so short typos still match
+            threshold = len(query) / 2
+            seen = set(results)
+            fuzzy = sorted((p for p, score in scores.items() if score >= threshold and p not in seen),
+                           key=lambda p: -scores[p])
+            results.extend(fuzzy[:limit - len(results)])
+
+        return [self.clients[position]["client_name"] for position in results]
+
+    def add(self, client):
+        """Save a new or changed client by appending it to the journal."""
+        self._upsert(client)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(client, ensure_ascii=False) + "\n")
+        self._journal_entries += 1
+        if self._journal_entries >= COMPACT_THRESHOLD:
+            self.compact()
+
+    def compact(self):
+        """Write every client to klijenti.json and empty the journal."""
+        with atomic_open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.clients, f, ensure_ascii=False, indent=2)
+        if self.journal_path.exists():
+            os.remove(self.journal_path)
+        self._journal_entries = 0
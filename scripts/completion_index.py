@@ -0,0 +1,104 @@
+#completion_index.py
+
+import re
+import heapq
+import bisect
+import unicodedata
+from collections import Counter
+
+# Đ has no Unicode decomposition, so the Croatian letters are mapped explicitly
+_FOLD_TRANSLATION = str.maketrans({
+    "č": "c", "ć": "c", "š": "s", "ž": "z", "đ": "d",
+    "Č": "c", "Ć": "c", "Š": "s", "Ž": "z", "Đ": "d",
+})
+# Results for one- and two-letter prefixes span much of the registry; they're cached
+CACHED_PREFIX_LEN = 2
+HOUSE_NUMBER_RE = re.compile(r"\s+\d+\s*\w?$")
+
+
+def fold(text):
+    """Lowercase and drop diacritics: 'Čakovec' -> 'cakovec', 'Đakovo' -> 'dakovo'."""
+    text = " ".join(text.lower().translate(_FOLD_TRANSLATION).split())
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _keys(name):
+    """Index keys of a name: from each word start, plus 'dj' spellings of đ."""
+    variants = {fold(name)}
+    if "đ" in name or "Đ" in name:
+        variants.add(fold(name.replace("đ", "dj").replace("Đ", "Dj")))
+    for variant in variants:
+        word_start = 0
+        for word_pos, word in enumerate(variant.split(" ")):
+            yield variant[word_start:], word_pos
+            word_start += len(word) + 1
+
+
+class PrefixIndex:
+    """Accent-insensitive prefix completion over a fixed list of names.
+
+    Every word of a name is indexed, so 'zelina' finds 'Sveti Ivan Zelina'.
+    A lookup bisects the sorted keys and ranks only the matching range: most
+    used first, then names that start with the text, then shorter names.
+    Weights are keyed by folded name, so a client's "Ribnik" counts for "RIBNIK".
+    """
+
+    def __init__(self, names, weights=None):
+        self.names = list(dict.fromkeys(names))
+        self.weights = Counter()
+        for name, count in (weights or {}).items():
+            self.weights[fold(name)] += count
+        self._folded = [fold(name) for name in self.names]
+        entries = sorted((key, word_pos, i) for i, name in enumerate(self.names) for key, word_pos in _keys(name))
+        self._keys = [entry[0] for entry in entries]
+        self._entries = [(entry[1], entry[2]) for entry in entries]
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def complete(self, text, limit=20):
+        prefix = fold(text)
+        if not prefix:
+            return []
+        cache_key = (prefix, limit)
+        if len(prefix) <= CACHED_PREFIX_LEN and cache_key in self._cache:
+            return self._cache[cache_key]
+
+        lo = bisect.bisect_left(self._keys, prefix)
+        hi = bisect.bisect_left(self._keys, prefix + "\uffff", lo)
+        # A name can match through several of its words; its best match counts
+        best = {}
+        for word_pos, i in self._entries[lo:hi]:
+            if word_pos < best.get(i, word_pos + 1):
+                best[i] = word_pos
+        names, folded, weights = self.names, self._folded, self.weights
+        ranked = heapq.nsmallest(limit, best.items(), key=lambda match: (
+            -weights[folded[match[0]]], match[1] > 0, len(names[match[0]]), names[match[0]]))
+        result = [names[i] for i, _ in ranked]
+
+        if len(prefix) <= CACHED_PREFIX_LEN:
+            self._cache[cache_key] = result
+        return result
+
+    def record_use(self, name):
+        """Rank `name` (in any spelling) higher from now on."""
+        self.weights[fold(name)] += 1
+        self._cache.clear()
+
+
+def street_name(address):
+    """Street part of an address: 'Ilica 12a' -> 'Ilica'."""
+    return HOUSE_NUMBER_RE.sub("", address.strip())
+
+
+def usage_counts(clients, city=None):
+    """How often each city (or, given a city, each street in it) occurs among saved clients, by folded name."""
+    if city is None:
+        return Counter(fold(c["city"]) for c in clients if c.get("city"))
+    key = fold(city)
+    return Counter(fold(street_name(c["address"])) for c in clients
+                   if c.get("address") and fold(c.get("city", "")) == key)
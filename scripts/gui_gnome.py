@@ -1,18 +1,46 @@
+import time
+# Startup is measured from here, before GTK and the pipeline modules are imported
+STARTUP_T0 = time.perf_counter()
+
 import gi
-import json
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, Gdk
+from gi.repository import Gtk, Gdk, GLib, Pango
 from datetime import datetime, timedelta
 from pathlib import Path
-import subprocess, platform, os, shutil
-import os
-from pathlib import Path
+import subprocess, platform, os
 import sys
+import threading
 
 from utilis import (
-    round_down_hour, render_odt_template, convert_to_pdf,
-    get_next_invoice_number, OUTPUT_DIR, TEMPLATE_PATH
+    round_down_hour, get_next_invoice_number, claim_invoice_number, warm_up_converter,
+    format_currency, build_invoice_context, OUTPUT_DIR, DEFAULT_PDF_BACKEND
 )
+from address_store import load_addresses
+from money import format_amount, to_decimal
+from items_model import ItemsModel
+from job_queue import GenerationQueue
+from invoice_archive import ensure_index, search_invoices, find_invoice_by_pdf, load_invoice_context
+from client_store import ClientStore
+from completion_index import PrefixIndex, usage_counts
+from instrumentation import METRICS, log_event
+
+JOB_STATUS_TEXT = {
+    "queued": "Na čekanju",
+    "rendering": "Izrada predloška",
+    "converting": "Konverzija u PDF",
+    "archiving": "Spremanje",
+    "done": "Gotovo",
+    "failed": "Greška",
+    "cancelled": "Otkazano",
+}
+JOB_ROW_LINGER_S = 5
+CLIENT_COMPLETION_LIMIT = 20
+CITY_COMPLETION_LIMIT = 20
+STREET_COMPLETION_LIMIT = 20
+# The window should be drawn within this long of starting; the address and client data follow
+STARTUP_TARGET_S = 0.5
+# Items table columns: model row id (hidden), name, quantity, unit price, line total
+ITEM_COL_ID, ITEM_COL_NAME, ITEM_COL_QTY, ITEM_COL_PRICE, ITEM_COL_TOTAL = range(5)
 
 def open_file_with_default_app(filepath):
     if platform.system() == "Windows":
@@ -79,12 +107,26 @@ class InvoiceWindow(Gtk.Window):
         self.vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=12)
         main_container.pack_start(self.vbox, True, True, 0)
 
-        # Load master data
-        self._load_naselja_and_ulice()
-        self._load_clients()
+        # Address registry, clients and the next invoice number load in the background;
+        # the window is shown first and they're attached once ready
+        self.addresses = None
+        self.client_store = None
+        self.city_index = None
+        self.street_index = None
+        # Completion models hold only the current matches; refilled as the text is typed
+        self.client_name_store = Gtk.ListStore(str)
+        self.city_store = Gtk.ListStore(str)
+        self.street_store = Gtk.ListStore(str)
+        self._master_data_loaded = threading.Event()
 
         self._build_ui()
-        self.populate_invoice_meta()
+        year_str = self.populate_invoice_meta()
+
+        self._first_draw_handler = self.connect("draw", self._on_first_draw)
+        threading.Thread(target=self._load_master_data, args=(year_str,), daemon=True).start()
+
+        # Start LibreOffice in the background so the first "Kreiraj račun" doesn't wait for it
+        threading.Thread(target=warm_up_converter, daemon=True).start()
 
     def _apply_custom_css(self):
         """Apply custom CSS styling for modern look"""
@@ -179,15 +221,6 @@ class InvoiceWindow(Gtk.Window):
             margin-bottom: 4px;
         }
         
-        /* List items */
-        .item-row {
-            background: rgba(255, 255, 255, 0.03);
-            border-radius: 6px;
-            margin: 2px 0;
-            padding: 8px;
-            border: 1px solid rgba(255, 255, 255, 0.08);
-        }
-        
         /* Total display */
         .total-display {
             font-size: 16px;
@@ -214,30 +247,58 @@ class InvoiceWindow(Gtk.Window):
             Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
         )
 
-    def _load_naselja_and_ulice(self):
-        base_path = Path(__file__).resolve().parent.parent / "database"
-        with open(base_path / "naselja.json", encoding="utf-8") as f:
-            self.naselja = json.load(f)
-        with open(base_path / "ulice.json", encoding="utf-8") as f:
-            self.ulice = json.load(f)
-
-    def _load_clients(self):
-        clients_path = Path(__file__).resolve().parent.parent / "database" / "klijenti.json"
-        if clients_path.exists():
-            with open(clients_path, encoding="utf-8") as f:
-                self.clients = json.load(f)
-        else:
-            self.clients = []
+    def _record_startup(self, phase):
+        elapsed = time.perf_counter() - STARTUP_T0
+        METRICS.observe(f"gui_{phase}", elapsed)
+        log_event("gui_startup", phase=phase, duration_ms=round(elapsed * 1000, 1))
+        if phase == "shell" and elapsed > STARTUP_TARGET_S:
+            print(f"⚠️ Window took {elapsed:.2f}s to show (target {STARTUP_TARGET_S}s)")
 
-        self.client_name_store = Gtk.ListStore(str)
-        self.client_name_store.clear()
-        for client in self.clients:
-            self.client_name_store.append([client['client_name']])
+    def _on_first_draw(self, widget, cr):
+        self.disconnect(self._first_draw_handler)
+        self._record_startup("shell")
+        return False
+
+    def _load_master_data(self, year_str):
+        """Runs on a worker thread; widgets are only touched from idle callbacks."""
+        try:
+            # The ledger may have to scan the year's folder the first time
+            GLib.idle_add(self._show_startup_invoice_number, get_next_invoice_number(OUTPUT_DIR, year_str))
+        except Exception as e:
+            print(f"⚠️ Could not suggest an invoice number: {e}")
 
-    def _save_clients(self):
-        clients_path = Path(__file__).resolve().parent.parent / "database" / "klijenti.json"
-        with open(clients_path, "w", encoding="utf-8") as f:
-            json.dump(self.clients, f, ensure_ascii=False, indent=2)
+        try:
+            # Loaded apart from the address registry, so clients work without database/ulice.json
+            try:
+                self.client_store = ClientStore()
+            except Exception as e:
+                GLib.idle_add(self.show_error, f"Greška pri učitavanju klijenata: {e}")
+            clients = self.client_store.clients if self.client_store is not None else []
+
+            try:
+                base_path = Path(__file__).resolve().parent.parent / "database"
+                addresses = load_addresses(base_path)
+                # Cities the saved clients are in rank first
+                self.city_index = PrefixIndex(addresses.city_names, usage_counts(clients))
+                self.addresses = addresses
+            except Exception as e:
+                GLib.idle_add(self.show_error, f"Greška pri učitavanju adresa: {e}")
+        finally:
+            # Set even on failure, so nothing waiting for the data blocks forever
+            self._master_data_loaded.set()
+        GLib.idle_add(self._attach_master_data)
+
+    def _attach_master_data(self):
+        # Catch up on anything typed while the data was loading
+        city_entry = self.client_entries["Grad"]
+        if city_entry.get_text().strip():
+            self.on_city_changed(city_entry)
+        name_entry = self.client_entries["Naziv / Ime i prezime"]
+        if name_entry.get_text().strip():
+            self.on_client_name_changed(name_entry)
+
+        self._record_startup("ready")
+        return False
 
     def _create_card_container(self, title=None, icon_name=None):
         """Create a card-like container with optional title and GNOME icon"""
@@ -311,6 +372,8 @@ class InvoiceWindow(Gtk.Window):
             completion = Gtk.EntryCompletion()
             completion.set_model(self.client_name_store)
             completion.set_text_column(0)
+            # The model is already filtered by the client store
+            completion.set_match_func(lambda *args: True, None)
             completion.set_inline_completion(True)
             completion.set_popup_completion(True)
             client_name_entry.set_completion(completion)
@@ -413,11 +476,9 @@ class InvoiceWindow(Gtk.Window):
         entry.get_style_context().add_class("modern-entry")
         completion = Gtk.EntryCompletion()
         completion.set_text_column(0)
-        city_store = Gtk.ListStore(str)
-        cities = sorted({n["NASELJE_NAZIV"] for n in self.naselja})
-        for city in cities:
-            city_store.append([city])
-        completion.set_model(city_store)
+        completion.set_model(self.city_store)
+        # The model is already filtered by the city index
+        completion.set_match_func(lambda *args: True, None)
         completion.set_inline_completion(True)
         completion.set_popup_completion(True)
         entry.set_completion(completion)
@@ -429,11 +490,13 @@ class InvoiceWindow(Gtk.Window):
         entry.get_style_context().add_class("modern-entry")
         completion = Gtk.EntryCompletion()
         completion.set_text_column(0)
-        self.street_store = Gtk.ListStore(str)
         completion.set_model(self.street_store)
+        # The model is already filtered by the city's street index
+        completion.set_match_func(lambda *args: True, None)
         completion.set_inline_completion(True)
         completion.set_popup_completion(True)
         entry.set_completion(completion)
+        entry.connect("changed", self.on_street_changed)
         return entry
 
     def _build_items_section(self, parent_box):
@@ -441,15 +504,40 @@ class InvoiceWindow(Gtk.Window):
         items_card = self._create_card_container("Stavke računa", icon_name="text-x-generic-symbolic")
         parent_box.pack_start(items_card, True, True, 0)
 
-        # Items list with styled scrolled window
-        self.items_listbox = Gtk.ListBox()
-        self.items_listbox.set_selection_mode(Gtk.SelectionMode.NONE)
-        
+        # Items table: only the visible rows are drawn, so long invoices stay responsive.
+        # The ListStore mirrors the ItemsModel, which holds the values and the grand total
+        self.items_model = ItemsModel()
+        self.items_store = Gtk.ListStore(int, str, str, str, str)
+        self.items_view = Gtk.TreeView(model=self.items_store)
+        self.items_view.get_selection().set_mode(Gtk.SelectionMode.MULTIPLE)
+        self.items_view.connect("key-press-event", self.on_items_key_press)
+
+        for column_id, title, width in (
+            (ITEM_COL_NAME, "Naziv stavke", 260),
+            (ITEM_COL_QTY, "Količina", 90),
+            (ITEM_COL_PRICE, "Jedinična cijena", 130),
+            (ITEM_COL_TOTAL, "Iznos", 110),
+        ):
+            renderer = Gtk.CellRendererText()
+            if column_id != ITEM_COL_NAME:
+                renderer.set_property("xalign", 1.0)
+            if column_id != ITEM_COL_TOTAL:
+                renderer.set_property("editable", True)
+                renderer.connect("edited", self.on_item_edited, column_id)
+            column = Gtk.TreeViewColumn(title, renderer, text=column_id)
+            column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+            column.set_fixed_width(width)
+            column.set_expand(column_id == ITEM_COL_NAME)
+            column.set_resizable(True)
+            self.items_view.append_column(column)
+        # Every column has a fixed size, so GTK doesn't measure rows that aren't on screen
+        self.items_view.set_fixed_height_mode(True)
+
         scrolled = Gtk.ScrolledWindow()
         scrolled.get_style_context().add_class("items-scroll")
         scrolled.set_min_content_height(140)
         scrolled.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
-        scrolled.add(self.items_listbox)
+        scrolled.add(self.items_view)
         items_card.pack_start(scrolled, True, True, 0)
 
         # Add item section
@@ -495,6 +583,11 @@ class InvoiceWindow(Gtk.Window):
         add_btn.connect("clicked", self.on_add_item)
         add_grid.attach(add_btn, 3, 1, 1, 1)
 
+        remove_btn = self._create_styled_button("Ukloni odabrane", "btn-danger", "list-remove")
+        remove_btn.set_tooltip_text("Ukloni odabrane stavke (Delete)")
+        remove_btn.connect("clicked", self.on_remove_selected_items)
+        add_grid.attach(remove_btn, 4, 1, 1, 1)
+
         # Total display with modern styling
         self.grand_total_label = Gtk.Label(label="Ukupno: 0,00 EUR", xalign=1)
         self.grand_total_label.get_style_context().add_class("total-display")
@@ -510,6 +603,15 @@ class InvoiceWindow(Gtk.Window):
         button_box.set_halign(Gtk.Align.CENTER)
         actions_card.pack_start(button_box, False, False, 0)
 
+        # PDF backend: the ODT template through LibreOffice, or the built-in layout without it
+        self.pdf_backend_combo = Gtk.ComboBoxText()
+        self.pdf_backend_combo.get_style_context().add_class("modern-entry")
+        self.pdf_backend_combo.append("libreoffice", "PDF: LibreOffice predložak")
+        self.pdf_backend_combo.append("native", "PDF: ugrađeni (brzi)")
+        self.pdf_backend_combo.set_active_id(DEFAULT_PDF_BACKEND)
+        self.pdf_backend_combo.set_tooltip_text("Način izrade PDF-a")
+        button_box.pack_start(self.pdf_backend_combo, False, False, 0)
+
         # Generate invoice button (primary)
         generate_btn = self._create_styled_button(" Kreiraj račun", "btn-primary", "document-new")
         generate_btn.connect("clicked", self.on_generate_invoice)
@@ -521,38 +623,62 @@ class InvoiceWindow(Gtk.Window):
         edit_btn.connect("clicked", self.on_select_invoice_for_editing)
         button_box.pack_start(edit_btn, False, False, 0)
 
+        # Search the invoice archive index
+        search_btn = self._create_styled_button("Pretraži račune", "btn-secondary", "system-search")
+        search_btn.set_tooltip_text("Pretraži arhivu računa po broju, kupcu ili OIB-u")
+        search_btn.connect("clicked", self.on_search_invoices)
+        button_box.pack_start(search_btn, False, False, 0)
+
+        # Background generation status, one row per queued or running invoice
+        self.jobs_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=4)
+        actions_card.pack_start(self.jobs_box, False, False, 0)
+        self.job_rows = {}
+        self.generation_queue = GenerationQueue(self.on_job_update, dispatch=GLib.idle_add)
+        self.connect("destroy", lambda w: self.generation_queue.shutdown())
+
     # ------------------ Callback handlers ---------------------
 
     def on_city_changed(self, entry):
         city_name = entry.get_text().strip()
-        self.street_store.clear()
+        self.city_store.clear()
+        self.street_index = None
+        if self.addresses is None:
+            return  # re-run by _attach_master_data
         if not city_name:
             self.client_entries["Poštanski broj"].set_text("")
             return
 
-        matched_naselja = [n for n in self.naselja if n["NASELJE_NAZIV"].strip().lower() == city_name.lower()]
-        naselje_ids = {n["NASELJE_MBR"] for n in matched_naselja}
-        matching_streets = sorted({u["ULICA_NAZIV"] for u in self.ulice if u["NASELJE_MBR"] in naselje_ids})
-        for street in matching_streets:
-            self.street_store.append([street])
+        for match in self.city_index.complete(city_name, limit=CITY_COMPLETION_LIMIT):
+            self.city_store.append([match])
 
-        if matched_naselja:
-            zip_code = matched_naselja[0].get("ZIP", "")
-            self.client_entries["Poštanski broj"].set_text(str(zip_code))
-        else:
-            self.client_entries["Poštanski broj"].set_text("")
+        streets = self.addresses.streets(city_name)
+        if streets:
+            clients = self.client_store.clients if self.client_store is not None else []
+            self.street_index = PrefixIndex(streets, usage_counts(clients, city_name))
+
+        self.client_entries["Poštanski broj"].set_text(self.addresses.zip_code(city_name))
+
+    def on_street_changed(self, entry):
+        self.street_store.clear()
+        if self.street_index is None:
+            return
+        for match in self.street_index.complete(entry.get_text(), limit=STREET_COMPLETION_LIMIT):
+            self.street_store.append([match])
 
     def on_client_name_changed(self, entry):
         name = entry.get_text().strip()
+        self.client_name_store.clear()
+        if self.client_store is None:
+            return  # re-run by _attach_master_data
+        for match in self.client_store.complete(name, limit=CLIENT_COMPLETION_LIMIT):
+            self.client_name_store.append([match])
+
         client = self._find_client_by_name(name)
         if client:
             self._fill_client_fields(client)
 
     def _find_client_by_name(self, name):
-        for client in self.clients:
-            if client["client_name"].strip().lower() == name.lower():
-                return client
-        return None
+        return self.client_store.find_by_name(name)
 
     def _fill_client_fields(self, client):
         self.client_entries["OIB"].set_text(client.get("oib", ""))
@@ -570,8 +696,8 @@ class InvoiceWindow(Gtk.Window):
             return
 
         try:
-            float(qty.replace(",", "."))
-            float(price.replace(",", "."))
+            to_decimal(qty)
+            to_decimal(price)
         except ValueError:
             self.show_error("Neispravna količina ili cijena!")
             return
@@ -583,106 +709,94 @@ class InvoiceWindow(Gtk.Window):
         self.new_item_price.set_text("")
 
     def _add_item_row(self, name, qty, price):
-        """Create styled item row"""
-        row = Gtk.ListBoxRow()
-        row.get_style_context().add_class("item-row")
-        
-        hbox = Gtk.Box(spacing=8, margin=6)
-        row.add(hbox)
-
-        # Name entry
-        name_entry = Gtk.Entry()
-        name_entry.get_style_context().add_class("modern-entry")
-        name_entry.set_text(name)
-        name_entry.set_hexpand(True)
-        hbox.pack_start(name_entry, True, True, 0)
-
-        # Quantity entry
-        qty_entry = Gtk.Entry()
-        qty_entry.get_style_context().add_class("modern-entry")
-        qty_entry.set_text(qty)
-        qty_entry.set_width_chars(8)
-        hbox.pack_start(qty_entry, False, False, 0)
-
-        # Price entry
-        price_entry = Gtk.Entry()
-        price_entry.get_style_context().add_class("modern-entry")
-        price_entry.set_text(price)
-        price_entry.set_width_chars(12)
-        hbox.pack_start(price_entry, False, False, 0)
-
-        # Line total label
-        line_total_label = Gtk.Label(label="0,00", xalign=1)
-        line_total_label.set_width_chars(10)
-        line_total_label.get_style_context().add_class("field-label")
-        hbox.pack_start(line_total_label, False, False, 0)
-
-        # Remove button with modern styling
-        remove_btn = self._create_styled_button("✕", "btn-danger")
-        remove_btn.set_tooltip_text("Ukloni stavku")
-        remove_btn.connect("clicked", lambda w: self.remove_item_row(row))
-        hbox.pack_start(remove_btn, False, False, 0)
-
-        def on_value_changed(*args):
-            self.update_line_total(qty_entry, price_entry, line_total_label)
-            self.update_grand_total()
-
-        qty_entry.connect("changed", on_value_changed)
-        price_entry.connect("changed", on_value_changed)
-
-        self.items_listbox.add(row)
-        self.items_listbox.show_all()
-
-        self.update_line_total(qty_entry, price_entry, line_total_label)
+        self.add_items([{"name": name, "quantity": qty, "unit_price": price}])
+
+    def add_items(self, items):
+        """Append raw name/quantity/unit_price items in one go.
+
+        The view is detached from the store while rows are appended, so it
+        lays out and redraws once instead of once per item.
+        """
+        rows = self.items_model.extend(items)
+        self.items_view.set_model(None)
+        for item in rows:
+            self.items_store.append([item.id, item.name, item.quantity, item.unit_price,
+                                     format_amount(item.line_total)])
+        self.items_view.set_model(self.items_store)
+        self.update_grand_total()
+
+    def on_item_edited(self, renderer, path, new_text, column_id):
+        row = self.items_store[path]
+        new_text = new_text.strip()
+        row[column_id] = new_text
+        if column_id == ITEM_COL_NAME:
+            self.items_model.update(row[ITEM_COL_ID], name=new_text)
+            return
+        # Only this row is re-priced; the model adjusts the grand total by the difference
+        field = "quantity" if column_id == ITEM_COL_QTY else "unit_price"
+        total = self.items_model.update(row[ITEM_COL_ID], **{field: new_text})
+        row[ITEM_COL_TOTAL] = format_amount(total)
         self.update_grand_total()
 
-    def remove_item_row(self, row):
-        self.items_listbox.remove(row)
+    def on_items_key_press(self, widget, event):
+        if event.keyval == Gdk.KEY_Delete:
+            self.on_remove_selected_items()
+            return True
+        return False
+
+    def on_remove_selected_items(self, *args):
+        store, paths = self.items_view.get_selection().get_selected_rows()
+        # Bottom-up, so removing a row doesn't shift the paths still to be removed
+        for path in reversed(paths):
+            tree_iter = store.get_iter(path)
+            self.items_model.remove(store[tree_iter][ITEM_COL_ID])
+            store.remove(tree_iter)
         self.update_grand_total()
 
-    def update_line_total(self, qty_entry, price_entry, total_label):
-        try:
-            q = float(qty_entry.get_text().replace(",", "."))
-            p = float(price_entry.get_text().replace(",", "."))
-            total = q * p
-            formatted = self.format_currency(total)
-            total_label.set_text(formatted)
-        except:
-            total_label.set_text("0,00")
+    def clear_items(self):
+        self.items_store.clear()
+        self.items_model.clear()
+        self.update_grand_total()
 
     def update_grand_total(self):
-        total = 0.0
-        for row in self.items_listbox.get_children():
-            hbox = row.get_child()
-            labels = [w for w in hbox.get_children() if isinstance(w, Gtk.Label)]
-            if labels:
-                # Find the total label (should be the one with currency format)
-                for label in labels:
-                    text = label.get_text()
-                    if "," in text and text.replace(" ", "").replace(",", ".").replace(".", "").isdigit():
-                        try:
-                            val = float(text.replace(" ", "").replace(",", "."))
-                            total += val
-                            break
-                        except ValueError:
-                            continue
-        formatted_total = self.format_currency(total)
-        self.grand_total_label.set_text(f"Ukupno: {formatted_total} EUR")
+        self.grand_total_label.set_text(f"Ukupno: {format_amount(self.items_model.total)} EUR")
 
     @staticmethod
     def format_currency(amount):
-        s = f"{amount:,.2f}".replace(",", "X").replace(".", ",").replace("X", " ")
-        return s
+        return format_currency(amount)
 
     def populate_invoice_meta(self):
+        """Fill in the dates; the invoice number is suggested by _load_master_data. Returns the year."""
         now = datetime.now()
         rounded = round_down_hour(now)
-        year_str = rounded.strftime("%Y")
-        inv_num = f"{get_next_invoice_number(OUTPUT_DIR, year_str)}/2/2"
-        self.invoice_number_entry.set_text(inv_num)
+        # An empty number is allocated from the ledger when the invoice is generated
+        self.suggested_invoice_number = None
         self.date_entry.set_text(rounded.strftime("%d.%m.%Y"))
         self.time_entry.set_text(rounded.strftime("%H:%M"))
         self.due_entry.set_text((rounded + timedelta(days=7)).strftime("%d.%m.%Y"))
+        return rounded.strftime("%Y")
+
+    def _show_startup_invoice_number(self, number):
+        if not self.invoice_number_entry.get_text():  # unless one was typed meanwhile
+            self._show_suggested_invoice_number(number)
+        return False
+
+    def _set_suggested_invoice_number(self, year_str):
+        self._show_suggested_invoice_number(get_next_invoice_number(OUTPUT_DIR, year_str))
+
+    def _show_suggested_invoice_number(self, number):
+        self.suggested_invoice_number = f"{number}/2/2"
+        self.invoice_number_entry.set_text(self.suggested_invoice_number)
+
+    def _claim_invoice_number(self, data):
+        """Reserve the invoice's number in the ledger before it is queued."""
+        year_str = data['invoice_date'].strftime("%Y")
+        # Another generator may have taken the suggested number meanwhile, so that one is allocated afresh
+        requested = None if data['invoice_number'] == self.suggested_invoice_number else data['invoice_number']
+        invoice_number = claim_invoice_number(OUTPUT_DIR, year_str, requested)
+        data['invoice_number'] = invoice_number
+        data['context']['invoice_number'] = invoice_number
+        self._set_suggested_invoice_number(year_str)
 
     def on_clear_client_fields(self, widget):
         fields_to_clear = [
@@ -704,59 +818,70 @@ class InvoiceWindow(Gtk.Window):
 
         # Prompt to save client if new
         self._prompt_save_client(data['context'])
+        if self.city_index is not None:
+            self.city_index.record_use(data['context']['city'])
 
-        year_folder = Path(OUTPUT_DIR) / data['invoice_date'].strftime("%Y")
-        year_folder.mkdir(parents=True, exist_ok=True)
-
-        # Format invoice number: replace '/' with '-'
-        invoice_num_for_file = data['invoice_number'].replace('/', '-')
+        # Reserving the number also moves the field on to the next free one
+        self._claim_invoice_number(data)
 
-        # Lowercase client name and keep spaces intact
-        client_name_for_file = data["client_name"].lower()
-
-        # Build filename with ' - ' separator
-        pdf_filename = f"{invoice_num_for_file} - {client_name_for_file}.pdf"
-        final_pdf_path = year_folder / pdf_filename
-
-        temp_dir = os.path.join(OUTPUT_DIR, "temp_gui")
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_odt_path = os.path.join(temp_dir, "temp_invoice.odt")
-        temp_pdf_path = os.path.join(temp_dir, "temp_invoice.pdf")
-
-        context = data['context']
-
-        try:
-            if not render_odt_template(TEMPLATE_PATH, temp_odt_path, context):
-                self.show_error("Neuspjelo kreiranje ODT predloška.")
-                return
+        # Rendering and conversion run in the background; the row below tracks progress
+        self.generation_queue.submit(data['context'], data['invoice_date'],
+                                     backend=self.pdf_backend_combo.get_active_id())
 
-            if not convert_to_pdf(temp_odt_path, temp_dir):
-                self.show_error("Neuspjelo konvertiranje PDF. Provjerite je li LibreOffice instaliran.")
-                return
+    def _add_job_row(self, job):
+        row = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8)
 
-            if not os.path.exists(temp_pdf_path):
-                self.show_error("PDF datoteka nije pronađena nakon konverzije.")
-                return
-
-            final_odt_path = year_folder / pdf_filename.replace(".pdf", ".odt")
-            shutil.copy(temp_odt_path, final_odt_path)
-
-            json_folder = Path(OUTPUT_DIR) / "._invoice_data" / year_folder.name
-            json_folder.mkdir(parents=True, exist_ok=True)
-            final_json_path = json_folder / pdf_filename.replace(".pdf", ".json")
-            with open(final_json_path, "w", encoding="utf-8") as jf:
-                json.dump(context, jf, ensure_ascii=False, indent=2)
-
-            shutil.move(temp_pdf_path, final_pdf_path)
-            shutil.rmtree(temp_dir, ignore_errors=True)
-
-            # Show success dialog with modern styling
-            self.show_success(f"Račun uspješno kreiran:\n{final_pdf_path.name}")
-
-            open_file_with_default_app(str(final_pdf_path))
-
-        except Exception as e:
-            self.show_error(f"Neočekivana greška: {e}")
+        label = Gtk.Label(label=job.label, xalign=0)
+        label.set_ellipsize(Pango.EllipsizeMode.END)
+        label.set_width_chars(30)
+        label.get_style_context().add_class("field-label")
+        row.pack_start(label, False, False, 0)
+
+        progress = Gtk.ProgressBar()
+        progress.set_show_text(True)
+        progress.set_valign(Gtk.Align.CENTER)
+        row.pack_start(progress, True, True, 0)
+
+        cancel_btn = self._create_styled_button("✕", "btn-danger")
+        cancel_btn.set_tooltip_text("Odustani")
+        cancel_btn.connect("clicked", lambda w: self.generation_queue.cancel(job.id))
+        row.pack_start(cancel_btn, False, False, 0)
+
+        self.jobs_box.pack_start(row, False, False, 0)
+        self.jobs_box.show_all()
+        self.job_rows[job.id] = (row, progress, cancel_btn)
+
+    def on_job_update(self, job):
+        """Called on the GTK main loop with a snapshot of a background job that changed stage."""
+        if job.id not in self.job_rows:
+            self._add_job_row(job)
+        row, progress, cancel_btn = self.job_rows[job.id]
+
+        progress.set_fraction(job.progress)
+        progress.set_text(JOB_STATUS_TEXT[job.status])
+        cancel_btn.set_sensitive(not job.finished)
+
+        if job.status == "done":
+            open_file_with_default_app(str(job.pdf_path))
+            GLib.timeout_add_seconds(JOB_ROW_LINGER_S, self._remove_job_row, job.id)
+        elif job.status == "cancelled":
+            self._refresh_suggested_invoice_number(job)
+            GLib.timeout_add_seconds(JOB_ROW_LINGER_S, self._remove_job_row, job.id)
+        elif job.status == "failed":
+            self._refresh_suggested_invoice_number(job)
+            progress.set_tooltip_text(job.error)
+            self.show_error(f"{job.label}: {job.error}")
+
+    def _refresh_suggested_invoice_number(self, job):
+        # The queue gave the job's number back, so the one shown may no longer be the next free one
+        if self.invoice_number_entry.get_text() == self.suggested_invoice_number:
+            self._set_suggested_invoice_number(job.invoice_date.strftime("%Y"))
+
+    def _remove_job_row(self, job_id):
+        entry = self.job_rows.pop(job_id, None)
+        if entry is not None:
+            self.jobs_box.remove(entry[0])
+        return False
 
     def _collect_invoice_data(self):
         client_name = self.client_entries["Naziv / Ime i prezime"].get_text().strip()
@@ -791,57 +916,27 @@ class InvoiceWindow(Gtk.Window):
         except:
             due_date = invoice_date + timedelta(days=7)
 
-        items = []
-        for row in self.items_listbox.get_children():
-            hbox = row.get_child()
-            entries = [w for w in hbox.get_children() if isinstance(w, Gtk.Entry)]
-            if len(entries) != 3:
-                continue
-
-            name = entries[0].get_text().strip()
-            if not name:
-                continue
-            qty_str = entries[1].get_text().strip()
-            price_str = entries[2].get_text().strip()
-            try:
-                qty = float(qty_str.replace(",", "."))
-                price = float(price_str.replace(",", "."))
-                line_total = qty * price
-                items.append({
-                    "name": name,
-                    "quantity": qty,
-                    "unit_price": price,
-                    "line_total": line_total,
-                    "formatted_unit_price": self.format_currency(price),
-                    "formatted_line_total": self.format_currency(line_total),
-                })
-            except ValueError:
-                self.show_error(f"Pogrešan unos količine ili cijene za stavku: {name}")
-                return None
+        try:
+            items = self.items_model.items()
+        except ValueError as e:
+            self.show_error(f"Pogrešan unos količine ili cijene za stavku: {e}")
+            return None
 
         if not items:
             self.show_error("Morate unijeti barem jednu stavku za račun.")
             return None
 
-        total = sum(i["line_total"] for i in items)
-
-        context = {
+        client = {
             "client_name": client_name,
             "oib": oib,
             "address": address,
             "postal_code": postal_code,
             "city": city,
-            "invoice_type": invoice_type,
-            "invoice_number": invoice_number,
-            "invoice_date": invoice_date.strftime("%d.%m.%Y") + " " + invoice_time.strftime("%H:%M"),
-            "invoice_time": invoice_time.strftime("%H:%M"),
-            "due_date": due_date.strftime("%d.%m.%Y"),
-            "due_date_desc": due_date.strftime("%d.%m.%Y"),
-            "location": "Rijeka",
-            "items": items,
-            "total": total,
-            "formatted_total": self.format_currency(total),
         }
+        context = build_invoice_context(
+            client, items, invoice_number, invoice_date,
+            invoice_time=invoice_time, due_date=due_date, invoice_type=invoice_type,
+        )
         return {
             "context": context,
             "invoice_date": invoice_date,
@@ -850,6 +945,10 @@ class InvoiceWindow(Gtk.Window):
         }
 
     def _prompt_save_client(self, context):
+        # Normally long finished; the loader thread never waits on the main loop
+        self._master_data_loaded.wait()
+        if self.client_store is None:
+            return
         if self._find_client_by_name(context["client_name"]):
             return  # Already saved
 
@@ -867,15 +966,13 @@ class InvoiceWindow(Gtk.Window):
         dialog.destroy()
 
         if response == Gtk.ResponseType.YES:
-            self.clients.append({
+            self.client_store.add({
                 "client_name": context["client_name"],
                 "oib": context["oib"],
                 "address": context["address"],
                 "postal_code": context["postal_code"],
                 "city": context["city"],
             })
-            self._save_clients()
-            self.client_name_store.append([context["client_name"]])
 
     def on_select_invoice_for_editing(self, widget):
         """Open file dialog to select an invoice PDF for editing"""
@@ -908,23 +1005,81 @@ class InvoiceWindow(Gtk.Window):
         
         dialog.destroy()
 
+    def on_search_invoices(self, widget):
+        """Dialog listing archived invoices, filtered as the user types"""
+        ensure_index()
+
+        dialog = Gtk.Dialog(title="Pretraga računa", parent=self, flags=0)
+        dialog.add_buttons(
+            Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+            Gtk.STOCK_OPEN, Gtk.ResponseType.OK
+        )
+        dialog.set_default_size(720, 420)
+        content = dialog.get_content_area()
+        content.set_spacing(8)
+        content.set_border_width(12)
+
+        search_entry = Gtk.SearchEntry()
+        search_entry.set_placeholder_text("Broj računa, kupac ili OIB...")
+        content.pack_start(search_entry, False, False, 0)
+
+        # Columns: number, date, client, OIB, total, pdf path (hidden)
+        store = Gtk.ListStore(str, str, str, str, str, str)
+        tree = Gtk.TreeView(model=store)
+        for i, title in enumerate(["Broj", "Datum", "Kupac", "OIB", "Iznos (EUR)"]):
+            renderer = Gtk.CellRendererText()
+            if i == 4:
+                renderer.set_property("xalign", 1.0)
+            column = Gtk.TreeViewColumn(title, renderer, text=i)
+            column.set_resizable(True)
+            column.set_expand(i == 2)
+            tree.append_column(column)
+
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.get_style_context().add_class("items-scroll")
+        scrolled.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        scrolled.add(tree)
+        content.pack_start(scrolled, True, True, 0)
+
+        def refresh(*args):
+            text = search_entry.get_text().strip()
+            store.clear()
+            oib = text if text.isdigit() and len(text) == 11 else None
+            for row in search_invoices(text=None if oib else text, oib=oib, limit=500):
+                date = row["invoice_date"] or ""
+                if date:
+                    date = datetime.strptime(date, "%Y-%m-%d").strftime("%d.%m.%Y")
+                store.append([
+                    row["invoice_number"], date, row["client_name"], row["oib"] or "",
+                    format_currency(row["total"] or 0), row["pdf_path"],
+                ])
+
+        search_entry.connect("search-changed", refresh)
+        tree.connect("row-activated", lambda *args: dialog.response(Gtk.ResponseType.OK))
+        refresh()
+        dialog.show_all()
+
+        response = dialog.run()
+        model, tree_iter = tree.get_selection().get_selected()
+        dialog.destroy()
+
+        if response == Gtk.ResponseType.OK and tree_iter is not None:
+            self._load_invoice_for_editing(Path(model[tree_iter][5]))
+
     def _load_invoice_for_editing(self, pdf_path):
-        """Load invoice data from JSON and populate the form"""
+        """Load the invoice's stored data from the archive and populate the form"""
         if not pdf_path.exists():
             self.show_error("Datoteka ne postoji.")
             return
 
-        # Find corresponding JSON file
-        year_folder = pdf_path.parent.name
-        json_path = Path(OUTPUT_DIR) / "._invoice_data" / year_folder / pdf_path.name.replace(".pdf", ".json")
-        
-        if not json_path.exists():
+        ensure_index()
+        indexed = find_invoice_by_pdf(pdf_path)
+        if indexed is None:
             self.show_error("Podaci za uređivanje nisu pronađeni.")
             return
 
         try:
-            with open(json_path, "r", encoding="utf-8") as jf:
-                data = json.load(jf)
+            data = load_invoice_context(indexed)
 
             # Populate form fields
             self.invoice_number_entry.set_text(data.get("invoice_number", ""))
@@ -946,16 +1101,14 @@ class InvoiceWindow(Gtk.Window):
             self.client_entries["Grad"].set_text(data.get("city", ""))
 
             # Clear existing items
-            for row in list(self.items_listbox.get_children()):
-                self.items_listbox.remove(row)
-
-            # Populate items
-            for item in data.get("items", []):
-                self._add_item_row(
-                    item["name"], 
-                    str(item["quantity"]).replace(".", ","),  # Convert back to Croatian format
-                    str(item["unit_price"]).replace(".", ",")  # Convert back to Croatian format
-                )
+            self.clear_items()
+
+            # Populate items in one batch, converted back to Croatian number format
+            self.add_items([{
+                "name": item["name"],
+                "quantity": str(item["quantity"]).replace(".", ","),
+                "unit_price": str(item["unit_price"]).replace(".", ","),
+            } for item in data.get("items", [])])
 
             self.show_info(f"Učitan račun: {pdf_path.name}")
 
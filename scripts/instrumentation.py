@@ -0,0 +1,174 @@
+#instrumentation.py
+
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+# BILLIO_LOG_FILE: JSON-lines event log ("-" for stderr)
+# BILLIO_METRICS_FILE: Prometheus text file, e.g. for node_exporter's textfile collector
+# BILLIO_QUIET=1: drop the per-invoice console messages
+LOG_PATH = os.environ.get("BILLIO_LOG_FILE")
+METRICS_PATH = os.environ.get("BILLIO_METRICS_FILE")
+METRICS_FLUSH_INTERVAL_S = 5
+
+logger = logging.getLogger("billio")
+logger.propagate = False
+
+_quiet = os.environ.get("BILLIO_QUIET", "") not in ("", "0")
+
+
+def set_quiet(quiet=True):
+    global _quiet
+    _quiet = quiet
+
+
+def say(message):
+    """Print a progress message unless quiet mode is on. Errors should still use print."""
+    if not _quiet:
+        print(message)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            "thread": record.threadName,
+            "pid": record.process,
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(path=LOG_PATH):
+    """Send structured events to `path` (or stderr for "-"). Without a path events are dropped."""
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    if not path:
+        logger.setLevel(logging.CRITICAL + 1)
+        return
+    handler = logging.StreamHandler(sys.stderr) if path == "-" else logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+def log_event(event, level=logging.INFO, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+class Metrics:
+    """Thread-safe counters and stage duration summaries in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._durations = {}  # (stage, outcome) -> [count, sum, max]
+        self._last_flush = 0.0
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, stage, seconds, outcome="ok"):
+        with self._lock:
+            summary = self._durations.setdefault((stage, outcome), [0, 0.0, 0.0])
+            summary[0] += 1
+            summary[1] += seconds
+            summary[2] = max(summary[2], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": {
+                    name + _format_labels(labels): value for (name, labels), value in self._counters.items()
+                },
+                "stages": {
+                    f"{stage}:{outcome}": {"count": s[0], "sum_s": round(s[1], 6), "max_s": round(s[2], 6)}
+                    for (stage, outcome), s in self._durations.items()
+                },
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            counter_names = sorted({name for name, _ in self._counters})
+            for name in counter_names:
+                lines.append(f"# TYPE {name} counter")
+                for (counter, labels), value in sorted(self._counters.items()):
+                    if counter == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+            if self._durations:
+                lines.append("# TYPE billio_stage_duration_seconds summary")
+                for (stage, outcome), (count, total, _) in sorted(self._durations.items()):
+                    labels = _format_labels((("outcome", outcome), ("stage", stage)))
+                    lines.append(f"billio_stage_duration_seconds_count{labels} {count}")
+                    lines.append(f"billio_stage_duration_seconds_sum{labels} {total:.6f}")
+                lines.append("# TYPE billio_stage_duration_seconds_max gauge")
+                for (stage, outcome), (_, _, longest) in sorted(self._durations.items()):
+                    labels = _format_labels((("outcome", outcome), ("stage", stage)))
+                    lines.append(f"billio_stage_duration_seconds_max{labels} {longest:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path=METRICS_PATH):
+        # Render workers in a process pool only see their own counters; the parent owns the file
+        if not path or multiprocessing.parent_process() is not None:
+            return
+        # Write then rename so a scraper never reads a half-written file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+        self._last_flush = time.monotonic()
+
+    def maybe_flush(self, path=METRICS_PATH):
+        if path and time.monotonic() - self._last_flush >= METRICS_FLUSH_INTERVAL_S:
+            self.write_textfile(path)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def stage(name, **fields):
+    """Time a pipeline stage: records its duration and outcome and logs a `stage` event.
+
+    `fields` (paths, invoice numbers) go to the log only, never into metric labels.
+    """
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        METRICS.observe(name, duration, outcome)
+        log_event("stage", stage=name, outcome=outcome, duration_ms=round(duration * 1000, 3), **fields)
+        METRICS.maybe_flush()
+
+
+configure_logging()
+if METRICS_PATH:
+    atexit.register(METRICS.write_textfile)
@@ -0,0 +1,354 @@
+#invoice_archive.py
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+from utilis import connect_sqlite, is_streaming_context, parse_invoice_sequence, OUTPUT_DIR
+from atomic_files import atomic_copy, atomic_move
+from invoice_journal import JournalError, append_records, read_record, scan_records
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    year TEXT NOT NULL,
+    invoice_number TEXT NOT NULL,
+    sequence INTEGER,
+    invoice_date TEXT,
+    client_name TEXT,
+    client_norm TEXT,
+    oib TEXT,
+    total REAL,
+    pdf_path TEXT,
+    data_path TEXT,
+    data_offset INTEGER,
+    PRIMARY KEY (year, invoice_number)
+);
+CREATE INDEX IF NOT EXISTS invoices_number ON invoices (invoice_number);
+CREATE INDEX IF NOT EXISTS invoices_date ON invoices (invoice_date);
+CREATE INDEX IF NOT EXISTS invoices_client ON invoices (client_norm);
+CREATE INDEX IF NOT EXISTS invoices_oib ON invoices (oib);
+CREATE INDEX IF NOT EXISTS invoices_total ON invoices (total);
+CREATE INDEX IF NOT EXISTS invoices_pdf ON invoices (pdf_path);
+-- What the index was built from, see _source_state()
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+COLUMNS = ("year", "invoice_number", "sequence", "invoice_date", "client_name",
+           "client_norm", "oib", "total", "pdf_path", "data_path", "data_offset")
+# Bumped when the table changes; the index is only a cache, so an old one is dropped and rebuilt
+INDEX_VERSION = 2
+# Sidecars appended to a journal per write during migration
+MIGRATE_CHUNK = 1000
+
+
+def invoice_data_dir(output_dir=OUTPUT_DIR):
+    return Path(output_dir) / "._invoice_data"
+
+
+def journal_path(year_str, output_dir=OUTPUT_DIR):
+    """Append-only journal holding the contexts of a year's invoices."""
+    return invoice_data_dir(output_dir) / f"{year_str}.journal"
+
+
+def _connection(output_dir):
+    conn = connect_sqlite(invoice_data_dir(output_dir) / "archive.sqlite")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+        conn.executescript(f"DROP TABLE IF EXISTS invoices; DROP TABLE IF EXISTS meta; PRAGMA user_version = {INDEX_VERSION};")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _legacy_sidecars(output_dir):
+    """Per-invoice ._invoice_data/<year>/*.json files written before the journal."""
+    return sorted(invoice_data_dir(output_dir).glob("*/*.json"))
+
+
+def _source_state(output_dir):
+    """Fingerprint of the indexed data: legacy sidecar count and newest mtime, and each journal's size."""
+    state = {}
+    sidecars = _legacy_sidecars(output_dir)
+    if sidecars:
+        state["sidecars"] = f"{len(sidecars)}:{max(path.stat().st_mtime_ns for path in sidecars)}"
+    for path in invoice_data_dir(output_dir).glob("*.journal"):
+        state[f"journal:{path.stem}"] = str(path.stat().st_size)
+    return state
+
+
+def invoice_file_stem(invoice_number, client_name):
+    """File name (without extension) used for archived invoices, e.g. '5-2-2 - john doe'."""
+    return f"{invoice_number.replace('/', '-')} - {client_name.lower()}"
+
+
+def _iso_date(invoice_date_str):
+    # Contexts store "dd.mm.YYYY HH:MM"; the index keeps ISO dates so ranges sort correctly
+    try:
+        return datetime.strptime(invoice_date_str.split()[0], "%d.%m.%Y").strftime("%Y-%m-%d")
+    except (ValueError, IndexError, AttributeError):
+        return None
+
+
+def _index_row(context, year_str, pdf_path, data_path, data_offset=None):
+    return (
+        year_str,
+        context.get("invoice_number", ""),
+        parse_invoice_sequence(context.get("invoice_number", "")),
+        _iso_date(context.get("invoice_date")),
+        context.get("client_name", ""),
+        context.get("client_name", "").strip().lower(),
+        context.get("oib", ""),
+        float(context.get("total") or 0),
+        str(pdf_path),
+        str(data_path),
+        data_offset,
+    )
+
+
+def write_invoice_record(context, year_str, output_dir=OUTPUT_DIR):
+    """Append the invoice context to the year's journal; returns (journal path, offset)."""
+    path = journal_path(year_str, output_dir)
+    return path, append_records(str(path), [context])[0]
+
+
+def load_invoice_context(row):
+    """The stored context of an indexed invoice (from the journal, or a legacy JSON file)."""
+    if row["data_offset"] is None:
+        with open(row["data_path"], encoding="utf-8") as jf:
+            return json.load(jf)
+    return read_record(row["data_path"], row["data_offset"])
+
+
+def archive_invoice(context, invoice_date, pdf_path, odt_path=None, output_dir=OUTPUT_DIR):
+    """Move a converted invoice into output/<year>/, journal its context and index it.
+
+    Every file is written under a temporary name and renamed into place, so
+    parallel generators never expose a half-written invoice.
+    """
+    if is_streaming_context(context):
+        raise ValueError("A streamed context has no items left to archive")
+    year_str = invoice_date.strftime("%Y")
+    year_folder = Path(output_dir) / year_str
+    year_folder.mkdir(parents=True, exist_ok=True)
+
+    stem = invoice_file_stem(context["invoice_number"], context["client_name"])
+    final_pdf_path = year_folder / f"{stem}.pdf"
+
+    if odt_path:
+        atomic_copy(odt_path, year_folder / f"{stem}.odt")
+
+    data_path, data_offset = write_invoice_record(context, year_str, output_dir)
+
+    # The PDF goes last: once it is visible, its ODT and journal record are already in place
+    atomic_move(pdf_path, final_pdf_path)
+
+    conn = _connection(output_dir)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(f"INSERT OR REPLACE INTO invoices VALUES ({', '.join('?' * len(COLUMNS))})",
+                     _index_row(context, year_str, final_pdf_path, data_path, data_offset))
+        # The journal has grown by a record that is now indexed; concurrent writers index their own
+        key = f"journal:{year_str}"
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        size = max(int(row[0]) if row else 0, os.path.getsize(data_path))
+        conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(size)))
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return final_pdf_path
+
+
+def _pdf_path(context, year_str, output_dir):
+    return Path(output_dir) / year_str / f"{invoice_file_stem(context['invoice_number'], context['client_name'])}.pdf"
+
+
+def rebuild_index(output_dir=OUTPUT_DIR):
+    """Re-create the index from the yearly journals and any legacy JSON sidecars."""
+    # Taken before reading, so data written meanwhile makes the next ensure_index rebuild again
+    state = _source_state(output_dir)
+    rows = []
+    for json_path in _legacy_sidecars(output_dir):
+        try:
+            with open(json_path, encoding="utf-8") as jf:
+                context = json.load(jf)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Skipping {json_path}: {e}")
+            continue
+        year_str = json_path.parent.name
+        pdf_path = Path(output_dir) / year_str / f"{json_path.stem}.pdf"
+        rows.append(_index_row(context, year_str, pdf_path, json_path))
+
+    # Journals come after the sidecars, and later records after earlier ones, so the newest version wins
+    for path in sorted(invoice_data_dir(output_dir).glob("*.journal")):
+        year_str = path.stem
+        for offset, context in scan_records(str(path)):
+            rows.append(_index_row(context, year_str, _pdf_path(context, year_str, output_dir), path, offset))
+
+    conn = _connection(output_dir)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM invoices")
+        conn.executemany(f"INSERT OR REPLACE INTO invoices VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+        conn.execute("DELETE FROM meta")
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", state.items())
+        conn.execute("COMMIT")
+        # Re-generated invoices appear more than once in the journal; only the latest is indexed
+        count = conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+    finally:
+        conn.close()
+    print(f"✅ Indexed {count} invoices")
+    return count
+
+
+def ensure_index(output_dir=OUTPUT_DIR):
+    """Rebuild the index when the journals or legacy sidecars hold data it hasn't seen.
+
+    That covers a first run, sidecars left from before an upgrade, and data
+    restored or copied in from elsewhere.
+    """
+    conn = _connection(output_dir)
+    try:
+        indexed = dict(conn.execute("SELECT key, value FROM meta"))
+    finally:
+        conn.close()
+    if _source_state(output_dir) != indexed:
+        rebuild_index(output_dir)
+
+
+def migrate_sidecars(output_dir=OUTPUT_DIR, remove=False):
+    """Copy the legacy JSON sidecars into the yearly journals and re-index.
+
+    Sidecars whose invoice (year, number and client) is already journaled are
+    not copied again, so an interrupted migration can simply be re-run. With
+    `remove`, a sidecar is deleted only after its record reads back intact.
+    Returns (copied, removed).
+    """
+    journaled = set()
+    for path in invoice_data_dir(output_dir).glob("*.journal"):
+        for _, context in scan_records(str(path)):
+            journaled.add((path.stem, context.get("invoice_number"), context.get("client_name")))
+
+    pending, done = {}, []
+    for json_path in _legacy_sidecars(output_dir):
+        try:
+            with open(json_path, encoding="utf-8") as jf:
+                context = json.load(jf)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Skipping {json_path}: {e}")
+            continue
+        year_str = json_path.parent.name
+        if (year_str, context.get("invoice_number"), context.get("client_name")) in journaled:
+            done.append(json_path)
+        else:
+            pending.setdefault(year_str, []).append((json_path, context))
+
+    copied = 0
+    for year_str, sidecars in sorted(pending.items()):
+        path = str(journal_path(year_str, output_dir))
+        for start in range(0, len(sidecars), MIGRATE_CHUNK):
+            chunk = sidecars[start:start + MIGRATE_CHUNK]
+            offsets = append_records(path, [context for _, context in chunk])
+            for (json_path, context), offset in zip(chunk, offsets):
+                try:
+                    if read_record(path, offset) == context:
+                        done.append(json_path)
+                        continue
+                except JournalError:
+                    pass
+                print(f"⚠️ {json_path} did not read back from {path}; keeping the JSON file")
+            copied += len(chunk)
+
+    removed = 0
+    if remove:
+        for json_path in done:
+            json_path.unlink()
+            removed += 1
+        for year_dir in invoice_data_dir(output_dir).iterdir():
+            if year_dir.is_dir() and year_dir.name.isdigit() and not any(year_dir.iterdir()):
+                year_dir.rmdir()
+
+    rebuild_index(output_dir)
+    return copied, removed
+
+
+def search_invoices(text=None, year=None, oib=None, date_from=None, date_to=None,
+                    limit=100, output_dir=OUTPUT_DIR):
+    """Query the index; `text` matches the invoice number or a client-name substring.
+
+    Dates are ISO strings (YYYY-MM-DD). Results are newest first.
+    """
+    clauses, params = [], []
+    if text:
+        clauses.append("(invoice_number LIKE ? OR client_norm LIKE ?)")
+        params += [f"{text.strip()}%", f"%{text.strip().lower()}%"]
+    if year:
+        clauses.append("year = ?")
+        params.append(str(year))
+    if oib:
+        clauses.append("oib = ?")
+        params.append(oib)
+    if date_from:
+        clauses.append("invoice_date >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("invoice_date <= ?")
+        params.append(date_to)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    conn = _connection(output_dir)
+    try:
+        rows = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM invoices {where} "
+            "ORDER BY invoice_date DESC, year DESC, sequence DESC LIMIT ?",
+            params + [limit]).fetchall()
+    finally:
+        conn.close()
+    return [dict(zip(COLUMNS, row)) for row in rows]
+
+
+def find_invoice_by_pdf(pdf_path, output_dir=OUTPUT_DIR):
+    conn = _connection(output_dir)
+    try:
+        row = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM invoices WHERE pdf_path = ?",
+                           (str(pdf_path),)).fetchone()
+    finally:
+        conn.close()
+    return dict(zip(COLUMNS, row)) if row else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index and search archived invoices.")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="re-index the invoice journals (and any legacy JSON files)")
+    migrate = sub.add_parser("migrate", help="move legacy ._invoice_data/<year>/*.json files into the journals")
+    migrate.add_argument("--remove", action="store_true", help="delete each JSON file once it is journaled")
+    search = sub.add_parser("search", help="list invoices matching the filters")
+    search.add_argument("text", nargs="?")
+    search.add_argument("--year")
+    search.add_argument("--oib")
+    search.add_argument("--from", dest="date_from", help="YYYY-MM-DD")
+    search.add_argument("--to", dest="date_to", help="YYYY-MM-DD")
+    search.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        rebuild_index(args.output_dir)
+    elif args.command == "migrate":
+        copied, removed = migrate_sidecars(args.output_dir, args.remove)
+        print(f"✅ Journaled {copied} invoices" + (f", removed {removed} JSON files" if args.remove else ""))
+    else:
+        for row in search_invoices(args.text, args.year, args.oib, args.date_from, args.date_to,
+                                   args.limit, args.output_dir):
+            print(f"{row['invoice_number']:>10}  {row['invoice_date'] or '':10}  "
+                  f"{row['client_name']:<30}  {row['oib'] or '':11}  {row['total']:>12.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
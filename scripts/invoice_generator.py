@@ -1,8 +1,6 @@
 import os
-import zipfile
 import shutil
-import subprocess
-from jinja2 import Template
+import tempfile
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -17,10 +15,13 @@ from utilis import (
     round_down_hour,
     render_odt_template,
     convert_to_pdf,
-    get_next_invoice_number,
+    allocate_invoice_number,
+    release_invoice_number,
     OUTPUT_DIR,
     TEMPLATE_PATH
 )
+from money import ZERO, format_amount, line_total
+from atomic_files import atomic_move
 
 # === Main Script ===
 if __name__ == "__main__":
@@ -59,39 +60,39 @@ if __name__ == "__main__":
 
     # Process items (same logic as in Flask app)
     items = []
-    total = 0.0
+    total = ZERO
     
     print("\n📊 PROCESSING ITEMS:")
     for i, item_data in enumerate(sample_items_data):
         try:
             quantity = item_data["quantity"]
             unit_price = item_data["unit_price"]
-            line_total = quantity * unit_price
-            total += line_total
+            line_amount = line_total(quantity, unit_price)
+            total += line_amount
             
             item = {
                 "name": item_data["name"],
                 "quantity": quantity,
                 "unit_price": unit_price,
-                "line_total": line_total,
-                "formatted_unit_price": f"{unit_price:,.2f}".replace(",", "X").replace(".", ",").replace("X", " "),
-                "formatted_line_total": f"{line_total:,.2f}".replace(",", "X").replace(".", ",").replace("X", " "),
+                "line_total": float(line_amount),
+                "formatted_unit_price": format_amount(unit_price),
+                "formatted_line_total": format_amount(line_amount),
             }
             items.append(item)
-            print(f"   ✅ {item['name']}: {quantity} x {unit_price} = {line_total}")
+            print(f"   ✅ {item['name']}: {quantity} x {unit_price} = {line_amount}")
             
         except Exception as e:
             print(f"   ❌ Error processing item {i+1}: {e}")
 
     # Format total Croatian style
-    formatted_total = f"{total:,.2f}".replace(",", "X").replace(".", ",").replace("X", " ")
+    formatted_total = format_amount(total)
     print(f"\n💰 TOTAL: {formatted_total} EUR")
 
     # Year string (4 digits)
     year_str = rounded_time.strftime("%Y")
 
-    # Calculate next invoice number for the year
-    next_invoice_num = get_next_invoice_number(OUTPUT_DIR, year_str)
+    # Reserve the next invoice number for the year
+    next_invoice_num = allocate_invoice_number(OUTPUT_DIR, year_str)
 
     # Invoice number string "X/2/2" where X is incrementing number
     invoice_number = f"{next_invoice_num}/2/2"
@@ -104,9 +105,8 @@ if __name__ == "__main__":
     pdf_filename = f"{next_invoice_num}-2-2_{safe_client_name}.pdf"
     final_pdf_path = year_folder / pdf_filename
 
-    # Temp paths - use a temp directory in the output folder
-    temp_dir = os.path.join(OUTPUT_DIR, 'temp_standalone')
-    os.makedirs(temp_dir, exist_ok=True)
+    # A private scratch directory, so parallel runs never share temp files
+    temp_dir = tempfile.mkdtemp(prefix="billio-standalone-")
     temp_odt_path = os.path.join(temp_dir, 'temp_invoice.odt')
     temp_pdf_path = os.path.join(temp_dir, 'temp_invoice.pdf')
 
@@ -128,7 +128,7 @@ if __name__ == "__main__":
         "due_date_desc": due_date_str,
         "location": "Rijeka",
         "items": items,  # This is the key change!
-        "total": total,
+        "total": float(total),
         "formatted_total": formatted_total,
     }
 
@@ -147,26 +147,33 @@ if __name__ == "__main__":
     print(f"Output directory: {OUTPUT_DIR}")
     print(f"Year folder: {year_folder}")
 
-    # Render the ODT invoice and convert to PDF
-    if not render_odt_template(TEMPLATE_PATH, temp_odt_path, context):
-        print("❌ Template rendering failed")
-        exit(1)
-    
-    if not convert_to_pdf(temp_odt_path, temp_dir):
-        print("❌ PDF conversion failed")
-        exit(1)
-
-    # Move the PDF to the final archive path
-    if os.path.exists(temp_pdf_path):
-        shutil.move(temp_pdf_path, final_pdf_path)
-        print(f"✅ Invoice archived to: {final_pdf_path}")
-    else:
-        print(f"❌ PDF file not found: {temp_pdf_path}")
-        exit(1)
-
-    # Clean up the temporary directory
-    if os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
+    archived = False
+    try:
+        # Render the ODT invoice and convert to PDF
+        if not render_odt_template(TEMPLATE_PATH, temp_odt_path, context):
+            print("❌ Template rendering failed")
+            exit(1)
+
+        if not convert_to_pdf(temp_odt_path, temp_dir):
+            print("❌ PDF conversion failed")
+            exit(1)
+
+        # Move the PDF to the final archive path
+        if os.path.exists(temp_pdf_path):
+            atomic_move(temp_pdf_path, final_pdf_path)
+            archived = True
+            print(f"✅ Invoice archived to: {final_pdf_path}")
+        else:
+            print(f"❌ PDF file not found: {temp_pdf_path}")
+            exit(1)
+    finally:
+        # A failed run gives its number back, so the year's sequence has no gap
+        if not archived:
+            release_invoice_number(OUTPUT_DIR, year_str, invoice_number)
+            print(f"↩️ Released invoice number {invoice_number}")
+
+        # Clean up the temporary directory
+        shutil.rmtree(temp_dir, ignore_errors=True)
         print("🧹 Cleaned up temporary files")
 
     print("="*50)
@@ -0,0 +1,108 @@
+#invoice_journal.py
+
+import os
+import json
+import mmap
+import zlib
+import struct
+
+# Every record: magic, payload length, CRC-32 of the payload, then the zlib-compressed compact JSON
+RECORD_MAGIC = b"BIJ1"
+RECORD_HEADER = struct.Struct("<4sII")
+# Each append is one O_APPEND write, so records from concurrent writers never interleave
+_APPEND_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0)
+
+
+class JournalError(Exception):
+    pass
+
+
+def encode_record(context):
+    payload = zlib.compress(json.dumps(context, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    return RECORD_HEADER.pack(RECORD_MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode_payload(payload, crc):
+    if zlib.crc32(payload) != crc:
+        raise JournalError("checksum mismatch")
+    return json.loads(zlib.decompress(payload))
+
+
+def append_records(path, contexts, sync=True):
+    """Append contexts to the journal at `path`; returns the offset of each record."""
+    records = [encode_record(context) for context in contexts]
+    if not records:
+        return []
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, _APPEND_FLAGS, 0o644)
+    try:
+        data = b"".join(records)
+        if os.write(fd, data) != len(data):
+            raise JournalError(f"Short write to {path}")
+        if sync:
+            os.fsync(fd)
+        # O_APPEND moved the position to the end of what was just written
+        offset = os.lseek(fd, 0, os.SEEK_CUR) - len(data)
+    finally:
+        os.close(fd)
+
+    offsets = []
+    for record in records:
+        offsets.append(offset)
+        offset += len(record)
+    return offsets
+
+
+def append_record(path, context, sync=True):
+    return append_records(path, [context], sync)[0]
+
+
+def read_record(path, offset):
+    """Point lookup of the record starting at `offset`."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        header = f.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            raise JournalError(f"No record at {path}:{offset}")
+        magic, length, crc = RECORD_HEADER.unpack(header)
+        if magic != RECORD_MAGIC:
+            raise JournalError(f"No record at {path}:{offset}")
+        payload = f.read(length)
+    if len(payload) < length:
+        raise JournalError(f"Truncated record at {path}:{offset}")
+    try:
+        return _decode_payload(payload, crc)
+    except (JournalError, zlib.error, ValueError) as e:
+        raise JournalError(f"Corrupt record at {path}:{offset}: {e}") from None
+
+
+def scan_records(path):
+    """Yield (offset, context) for every intact record, in the order written.
+
+    A damaged region (e.g. a write cut short by a crash) is reported and skipped
+    by searching for the next record marker.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        size, offset = len(data), 0
+        while offset + RECORD_HEADER.size <= size:
+            magic, length, crc = RECORD_HEADER.unpack_from(data, offset)
+            end = offset + RECORD_HEADER.size + length
+            context = None
+            if magic == RECORD_MAGIC and end <= size:
+                try:
+                    context = _decode_payload(data[offset + RECORD_HEADER.size:end], crc)
+                except (JournalError, zlib.error, ValueError):
+                    pass
+            if context is None:
+                next_offset = data.find(RECORD_MAGIC, offset + 1)
+                print(f"⚠️ Skipping damaged journal bytes {offset}-{next_offset if next_offset >= 0 else size} in {path}")
+                if next_offset < 0:
+                    return
+                offset = next_offset
+                continue
+            yield offset, context
+            offset = end
+        if offset < size:
+            print(f"⚠️ Ignoring {size - offset} trailing bytes in {path}")
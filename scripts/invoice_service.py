@@ -0,0 +1,339 @@
+#invoice_service.py
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from utilis import (
+    OUTPUT_DIR,
+    TEMPLATE_PATH,
+    PDF_BACKENDS,
+    DEFAULT_PDF_BACKEND,
+    claim_invoice_number,
+    warm_up_converter
+)
+from batch_generator import CLIENT_FIELDS, prepare_context
+from job_queue import GenerationQueue
+from instrumentation import METRICS, log_event, set_quiet
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_QUEUE = 32
+MAX_BODY_BYTES = 1024 * 1024
+# Finished jobs stay queryable this long before they're forgotten
+JOB_TTL_S = 3600
+DEFAULT_WAIT_S = 60
+
+JOB_PATH_RE = re.compile(r"^/invoices/(\d+)(/pdf)?$")
+# Invoice-level fields that are printed or parsed as text
+TEXT_FIELDS = ("invoice_number", "invoice_type", "location", "invoice_date", "invoice_time",
+               "due_date", "due_date_desc", "backend")
+ITEM_FIELDS = ("name", "quantity", "unit_price", "vat_rate")
+
+
+class QueueFull(Exception):
+    pass
+
+
+def invoice_from_payload(payload):
+    """Turn a request body into the invoice dict `prepare_context` reads.
+
+    Accepts the context schema `_collect_invoice_data` builds ("invoice_date"
+    as "dd.mm.YYYY HH:MM"); derived fields such as line totals are ignored and
+    recomputed.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Request body must be a JSON object")
+    if not str(payload.get("client_name", "")).strip():
+        raise ValueError("client_name is required")
+    # Client fields may be numbers (a postal code, an OIB); everything else must be text or absent
+    for field in CLIENT_FIELDS:
+        value = payload.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (str, int))):
+            raise ValueError(f"{field} must be a string")
+    for field in TEXT_FIELDS:
+        if payload.get(field) is not None and not isinstance(payload[field], str):
+            raise ValueError(f"{field} must be a string")
+    items = payload.get("items")
+    if not isinstance(items, list) or not items:
+        raise ValueError("items must be a non-empty list")
+
+    invoice = dict(payload)
+    invoice["items"] = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not str(item.get("name", "")).strip():
+            raise ValueError(f"items[{index}] needs a name")
+        if "quantity" not in item or "unit_price" not in item:
+            raise ValueError(f"items[{index}] needs quantity and unit_price")
+        invoice["items"].append({key: item[key] for key in ITEM_FIELDS if key in item})
+
+    date_text = str(payload.get("invoice_date") or "").strip()
+    if " " in date_text:
+        invoice["invoice_date"], invoice_time = date_text.split(" ", 1)
+        invoice.setdefault("invoice_time", invoice_time)
+    # The context schema repeats the due date as due_date_desc
+    invoice["due_date"] = payload.get("due_date") or payload.get("due_date_desc")
+    return invoice
+
+
+class InvoiceService:
+    """Accepts invoices, runs them on a GenerationQueue and tracks their jobs.
+
+    At most `max_queue` jobs may be queued or running; further submissions are
+    refused with QueueFull so callers can back off.
+    """
+
+    def __init__(self, output_dir=OUTPUT_DIR, template_path=TEMPLATE_PATH, workers=2,
+                 max_queue=DEFAULT_MAX_QUEUE, backend=DEFAULT_PDF_BACKEND):
+        self.output_dir = output_dir
+        self.max_queue = max_queue
+        self.backend = backend
+        self.queue = GenerationQueue(self._on_update, max_workers=workers, template_path=template_path,
+                                     output_dir=output_dir)
+        self._lock = threading.Lock()
+        self._finished_at = {}
+
+    def _on_update(self, job):
+        if job.finished:
+            with self._lock:
+                self._finished_at[job.id] = time.monotonic()
+            METRICS.inc("billio_service_jobs_total", status=job.status)
+            log_event("job_finished", job_id=job.id, status=job.status, error=job.error,
+                      invoice_number=job.context["invoice_number"])
+
+    def _prune(self):
+        cutoff = time.monotonic() - JOB_TTL_S
+        for job_id, finished in list(self._finished_at.items()):
+            if finished < cutoff:
+                del self._finished_at[job_id]
+                self.queue.jobs.pop(job_id, None)
+
+    def submit(self, payload):
+        """Validate and queue an invoice. Raises ValueError or QueueFull."""
+        invoice = invoice_from_payload(payload)
+        invoice_number = invoice.get("invoice_number") or None
+        context, invoice_date = prepare_context(invoice, invoice_number)
+        backend = invoice.get("backend") or self.backend
+        if backend not in PDF_BACKENDS:
+            raise ValueError(f"Unknown PDF backend: {backend}")
+
+        with self._lock:
+            self._prune()
+            if self.queue.pending_count() >= self.max_queue:
+                METRICS.inc("billio_service_rejected_total")
+                raise QueueFull()
+            # Numbers are only taken for accepted invoices
+            context["invoice_number"] = claim_invoice_number(
+                self.output_dir, invoice_date.strftime("%Y"), invoice_number)
+            return self.queue.submit(context, invoice_date, backend=backend)
+
+    def get(self, job_id):
+        return self.queue.jobs.get(job_id)
+
+    def health(self):
+        return {
+            "status": "ok",
+            "pending": self.queue.pending_count(),
+            "max_queue": self.max_queue,
+            "backend": self.backend,
+        }
+
+    def shutdown(self):
+        self.queue.shutdown(wait=False)
+
+
+def job_status(job):
+    status = {
+        "job_id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "invoice_number": job.context["invoice_number"],
+        "client_name": job.context["client_name"],
+        "total": job.context["formatted_total"],
+        "status_url": f"/invoices/{job.id}",
+    }
+    if job.error:
+        status["error"] = job.error
+    if job.status == "done":
+        status["pdf_url"] = f"/invoices/{job.id}/pdf"
+    return status
+
+
+class InvoiceRequestHandler(BaseHTTPRequestHandler):
+    server_version = "BillioInvoiceService/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        log_event("http_request", client=self.client_address[0], message=format % args)
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {"error": message}, headers)
+
+    def _send_pdf(self, job, status=HTTPStatus.OK):
+        try:
+            with open(job.pdf_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return self._send_error(HTTPStatus.GONE, "PDF is no longer available")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Disposition", f'inline; filename="{os.path.basename(job.pdf_path)}"')
+        self.send_header("X-Invoice-Number", job.context["invoice_number"])
+        self.send_header("X-Job-Id", str(job.id))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        token = self.server.token
+        if token and self.headers.get("Authorization") != f"Bearer {token}":
+            self._send_error(HTTPStatus.UNAUTHORIZED, "Missing or wrong bearer token")
+            return False
+        return True
+
+    def _path_and_query(self):
+        path, _, query = self.path.partition("?")
+        params = dict(part.partition("=")[::2] for part in query.split("&") if part)
+        return path.rstrip("/") or "/", params
+
+    def do_GET(self):
+        path, _ = self._path_and_query()
+        if path == "/health":
+            return self._send_json(HTTPStatus.OK, self.service.health())
+        if not self._authorized():
+            return
+        if path == "/metrics":
+            data = METRICS.to_prometheus().encode("utf-8")
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        match = JOB_PATH_RE.match(path)
+        job = self.service.get(int(match.group(1))) if match else None
+        if job is None:
+            return self._send_error(HTTPStatus.NOT_FOUND, "No such job")
+        if not match.group(2):
+            return self._send_json(HTTPStatus.OK, job_status(job))
+        if job.status != "done":
+            return self._send_json(HTTPStatus.CONFLICT, job_status(job))
+        self._send_pdf(job)
+
+    def do_POST(self):
+        path, params = self._path_and_query()
+        if path != "/invoices":
+            return self._send_error(HTTPStatus.NOT_FOUND, "Unknown endpoint")
+        if not self._authorized():
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+        try:
+            payload = json.loads(self.rfile.read(length) or b"null")
+        except ValueError:
+            return self._send_error(HTTPStatus.BAD_REQUEST, "Body is not valid JSON")
+
+        try:
+            job = self.service.submit(payload)
+        except QueueFull:
+            return self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, "Queue is full, retry later",
+                                    {"Retry-After": "5"})
+        except (KeyError, ValueError, TypeError) as e:
+            return self._send_error(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+
+        # ?wait=<seconds> holds the request until the PDF is ready and returns it directly
+        if "wait" in params:
+            try:
+                timeout = min(float(params["wait"] or DEFAULT_WAIT_S), DEFAULT_WAIT_S)
+            except ValueError:
+                timeout = DEFAULT_WAIT_S
+            try:
+                job.future.result(timeout=timeout)
+            except Exception:
+                pass  # still running or cancelled; the status below tells the caller
+            if job.status == "done":
+                return self._send_pdf(job, HTTPStatus.CREATED)
+            if job.status == "failed":
+                return self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, job_status(job))
+
+        self._send_json(HTTPStatus.ACCEPTED, job_status(job), {"Location": f"/invoices/{job.id}"})
+
+    def do_DELETE(self):
+        path, _ = self._path_and_query()
+        if not self._authorized():
+            return
+        match = JOB_PATH_RE.match(path)
+        job = self.service.get(int(match.group(1))) if match and not match.group(2) else None
+        if job is None:
+            return self._send_error(HTTPStatus.NOT_FOUND, "No such job")
+        if not self.service.queue.cancel(job.id):
+            return self._send_json(HTTPStatus.CONFLICT, job_status(job))
+        self._send_json(HTTPStatus.ACCEPTED, job_status(job))
+
+
+class InvoiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, address, service, token=None):
+        super().__init__(address, InvoiceRequestHandler)
+        self.service = service
+        self.token = token
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve invoice generation over local HTTP/JSON.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=2, help="invoices rendered at the same time")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                        help="queued or running invoices before requests get 503")
+    parser.add_argument("--backend", choices=PDF_BACKENDS, default=DEFAULT_PDF_BACKEND)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--template", default=TEMPLATE_PATH)
+    args = parser.parse_args(argv)
+
+    set_quiet(True)
+    if args.backend == "libreoffice":
+        warm_up_converter()
+
+    service = InvoiceService(args.output_dir, args.template, args.workers, args.max_queue, args.backend)
+    server = InvoiceHTTPServer((args.host, args.port), service, os.environ.get("BILLIO_SERVICE_TOKEN"))
+    print(f"🚀 Invoice service listening on http://{args.host}:{args.port} "
+          f"({args.workers} workers, queue {args.max_queue}, {args.backend})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
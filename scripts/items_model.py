@@ -0,0 +1,96 @@
+#items_model.py
+
+import itertools
+
+from money import ZERO, line_total
+
+
+class ItemRow:
+    __slots__ = ("id", "name", "quantity", "unit_price", "line_total", "valid")
+
+    def __init__(self, row_id, name, quantity, unit_price):
+        self.id = row_id
+        self.name = name
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.line_total = ZERO
+        self.valid = False
+
+
+class ItemsModel:
+    """Invoice items as typed in the editor, with the grand total kept up to date.
+
+    Quantities and prices are kept as the entered text. Each edit re-prices only
+    the changed row and adjusts the total by the difference, so an edit costs
+    the same however long the invoice is.
+    """
+
+    def __init__(self):
+        self._rows = {}  # insertion ordered, so iteration follows the editor
+        self._ids = itertools.count(1)
+        self.total = ZERO
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows.values())
+
+    def __getitem__(self, row_id):
+        return self._rows[row_id]
+
+    def _reprice(self, row):
+        try:
+            new_total = line_total(row.quantity, row.unit_price)
+            # A NaN or infinity in the running total could never be subtracted out again
+            if not new_total.is_finite():
+                raise ValueError(new_total)
+            row.valid = True
+        except (ValueError, ArithmeticError):
+            new_total = ZERO  # shown as 0,00 until the entry parses
+            row.valid = False
+        self.total += new_total - row.line_total
+        row.line_total = new_total
+        return new_total
+
+    def add(self, name, quantity, unit_price):
+        row = ItemRow(next(self._ids), name, quantity, unit_price)
+        self._rows[row.id] = row
+        self._reprice(row)
+        return row
+
+    def extend(self, items):
+        """Add raw name/quantity/unit_price dicts; returns the new rows."""
+        return [self.add(item["name"], item["quantity"], item["unit_price"]) for item in items]
+
+    def update(self, row_id, name=None, quantity=None, unit_price=None):
+        row = self._rows[row_id]
+        if name is not None:
+            row.name = name
+        if quantity is None and unit_price is None:
+            return row.line_total
+        if quantity is not None:
+            row.quantity = quantity
+        if unit_price is not None:
+            row.unit_price = unit_price
+        return self._reprice(row)
+
+    def remove(self, row_id):
+        row = self._rows.pop(row_id)
+        self.total -= row.line_total
+
+    def clear(self):
+        self._rows.clear()
+        self.total = ZERO
+
+    def items(self):
+        """Named rows as raw item dicts. Raises ValueError naming the first row that doesn't parse."""
+        items = []
+        for row in self._rows.values():
+            name = row.name.strip()
+            if not name:
+                continue
+            if not row.valid:
+                raise ValueError(name)
+            items.append({"name": name, "quantity": row.quantity.strip(), "unit_price": row.unit_price.strip()})
+        return items
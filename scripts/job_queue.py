@@ -0,0 +1,156 @@
+#job_queue.py
+
+import copy
+import shutil
+import tempfile
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utilis import render_invoice_pdf, release_invoice_number, OUTPUT_DIR, TEMPLATE_PATH, DEFAULT_PDF_BACKEND
+from invoice_archive import archive_invoice
+from instrumentation import stage
+
+# Progress shown for each stage a job passes through
+STAGE_PROGRESS = {
+    "queued": 0.0,
+    "rendering": 0.15,
+    "converting": 0.4,
+    "archiving": 0.9,
+    "done": 1.0,
+    "failed": 1.0,
+    "cancelled": 1.0,
+}
+FINISHED_STAGES = ("done", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class GenerationJob:
+    def __init__(self, job_id, context, invoice_date, label, backend):
+        self.id = job_id
+        self.context = context
+        self.invoice_date = invoice_date
+        self.label = label
+        self.backend = backend
+        self.status = "queued"
+        self.error = None
+        self.pdf_path = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def progress(self):
+        return STAGE_PROGRESS[self.status]
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STAGES
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def snapshot(self):
+        """A copy frozen at the current stage, for callbacks that run after the worker has moved on."""
+        return copy.copy(self)
+
+
+class GenerationQueue:
+    """Runs render -> convert -> archive jobs off the calling thread.
+
+    `on_update(job)` is called after every status change through `dispatch`,
+    which for the GTK window is GLib.idle_add so callbacks land on the main loop.
+    It receives a snapshot of the job, so a late callback still sees the stage it
+    was sent for.
+    """
+
+    def __init__(self, on_update, dispatch=None, max_workers=2, template_path=TEMPLATE_PATH,
+                 output_dir=OUTPUT_DIR):
+        self.on_update = on_update
+        self.dispatch = dispatch or (lambda fn: fn())
+        self.template_path = template_path
+        self.output_dir = output_dir
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="invoice-job")
+
+    def submit(self, context, invoice_date, label=None, backend=None):
+        job = GenerationJob(next(self._ids), context, invoice_date,
+                            label or f"{context['invoice_number']} - {context['client_name']}",
+                            backend or DEFAULT_PDF_BACKEND)
+        self.jobs[job.id] = job
+        self._notify(job)
+        job.future = self._executor.submit(self._run, job)
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or stop a running one before its next stage."""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        job._cancel.set()
+        if job.future is not None and job.future.cancel():
+            self._release_number(job)
+            self._set_status(job, "cancelled")
+        return True
+
+    def pending_count(self):
+        return sum(1 for job in self.jobs.values() if not job.finished)
+
+    def _notify(self, job):
+        snapshot = job.snapshot()
+        self.dispatch(lambda: self.on_update(snapshot))
+
+    def _set_status(self, job, status):
+        job.status = status
+        self._notify(job)
+
+    def _enter_stage(self, job, status):
+        # A running LibreOffice conversion can't be interrupted, so cancellation takes effect between stages
+        if job.cancel_requested:
+            raise JobCancelled()
+        self._set_status(job, status)
+
+    def _release_number(self, job):
+        try:
+            release_invoice_number(self.output_dir, job.invoice_date.strftime("%Y"), job.context["invoice_number"])
+        except Exception as e:
+            print(f"⚠️ Could not release invoice number {job.context['invoice_number']}: {e}")
+
+    def _run(self, job):
+        scratch_dir = tempfile.mkdtemp(prefix="billio-job-")
+        archiving = False
+        try:
+            rendered = render_invoice_pdf(job.context, scratch_dir, job.backend, self.template_path,
+                                          on_stage=lambda stage: self._enter_stage(job, stage),
+                                          cache_root=self.output_dir)
+            if rendered is None:
+                raise RuntimeError("Neuspjela izrada PDF računa. Provjerite je li LibreOffice instaliran."
+                                   if job.backend == "libreoffice" else "Neuspjela izrada PDF računa.")
+            pdf_path, odt_path = rendered
+
+            self._enter_stage(job, "archiving")
+            archiving = True
+            with stage("archive", invoice_number=job.context["invoice_number"]):
+                job.pdf_path = archive_invoice(job.context, job.invoice_date, pdf_path, odt_path, self.output_dir)
+            self._set_status(job, "done")
+        except JobCancelled:
+            self._release_number(job)
+            self._set_status(job, "cancelled")
+        except Exception as e:
+            # A failure while archiving may have published part of the invoice, so its number stays used
+            if not archiving:
+                self._release_number(job)
+            job.error = str(e)
+            self._set_status(job, "failed")
+        finally:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+        return job
+
+    def shutdown(self, wait=False):
+        for job in self.jobs.values():
+            job._cancel.set()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,130 @@
+#money.py
+
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+# Croatian PDV rates, in percent
+VAT_RATES = (25, 13, 5, 0)
+# The seller is outside the VAT system (čl. 90 Zakona o PDV), so items carry no PDV unless set
+DEFAULT_VAT_RATE = 0
+
+# Parsed quantities and prices stay below 10^12, so a line total (two factors, rounded to the cent)
+# and sums of many such lines fit Decimal's default 28-digit precision. Computed amounts aren't bounded.
+MAX_DIGITS = 12
+# "1 234,50" -> "1234.50" in one pass; also drops non-breaking and thin spaces
+_NUMBER_TRANSLATION = str.maketrans({" ": None, "\u00a0": None, "\u202f": None, ",": "."})
+# "1,234.50" -> "1 234,50" in one pass
+_FORMAT_TRANSLATION = str.maketrans({",": " ", ".": ","})
+
+
+def _finite(amount, value):
+    if not amount.is_finite() or amount.adjusted() >= MAX_DIGITS:
+        raise ValueError(f"Not a usable amount: {value!r}")
+    return amount
+
+
+def to_decimal(value):
+    """Parse an amount or quantity: Croatian text ('1 234,50'), int, float or Decimal.
+
+    Raises ValueError for text that isn't a number, NaN, infinities and values of
+    MAX_DIGITS or more integer digits.
+    """
+    kind = type(value)
+    try:
+        if kind is str:
+            return _finite(Decimal(value.translate(_NUMBER_TRANSLATION)), value)
+        if kind is Decimal:
+            return _finite(value, value)
+        if kind is float:
+            return _finite(Decimal(repr(value)), value)  # shortest repr, so 0.1 stays 0.1
+        if isinstance(value, (int, Decimal)):
+            return _finite(Decimal(value), value)
+    except ArithmeticError:  # InvalidOperation, Overflow
+        raise ValueError(f"Not a number: {value!r}") from None
+    return to_decimal(str(value))
+
+
+def round_cents(amount):
+    # Line and grand totals may exceed MAX_DIGITS; only parsed input is bounded
+    if type(amount) is not Decimal:
+        amount = to_decimal(amount)
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def format_amount(amount):
+    """Format as Croatian currency text, e.g. Decimal('1234.5') -> '1 234,50'."""
+    return f"{round_cents(amount):,}".translate(_FORMAT_TRANSLATION)
+
+
+def format_rate(rate):
+    """Format a PDV rate without trailing zeros, e.g. Decimal('25.00') -> '25', 5.5 -> '5,5'."""
+    return f"{to_decimal(rate).normalize():f}".translate(_FORMAT_TRANSLATION)
+
+
+def line_total(quantity, unit_price):
+    return (to_decimal(quantity) * to_decimal(unit_price)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def line_totals(quantities, unit_prices):
+    """Line totals for parallel sequences of quantities and unit prices, rounded to the cent."""
+    parse, quantize = to_decimal, Decimal.quantize
+    return [quantize(parse(q) * parse(p), CENT, ROUND_HALF_UP) for q, p in zip(quantities, unit_prices)]
+
+
+def parse_vat_rate(rate):
+    rate = to_decimal(rate)
+    if rate < 0 or rate > 100:
+        raise ValueError(f"PDV rate out of range: {rate}")
+    return rate
+
+
+def vat_summary(totals_by_rate):
+    """Per-rate PDV breakdown from {rate: net base}, highest rate first.
+
+    PDV is computed once per rate on the summed base, as it is shown on the invoice.
+    """
+    summary = []
+    for rate in sorted(totals_by_rate, reverse=True):
+        base = totals_by_rate[rate]
+        vat = (base * rate / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        summary.append({"rate": rate, "base": base, "vat": vat, "gross": base + vat})
+    return summary
+
+
+class InvoiceTotals:
+    """Running net/PDV totals for items added one at a time or in bulk."""
+
+    def __init__(self, default_rate=DEFAULT_VAT_RATE):
+        self.default_rate = parse_vat_rate(default_rate)
+        self.by_rate = {}
+        self.count = 0
+
+    def add(self, item):
+        """Add a raw name/quantity/unit_price(/vat_rate) item; returns its quantity, price, rate and line total."""
+        quantity = to_decimal(item["quantity"])
+        price = to_decimal(item["unit_price"])
+        rate = item.get("vat_rate")
+        rate = self.default_rate if rate is None or rate == "" else parse_vat_rate(rate)
+        total = (quantity * price).quantize(CENT, rounding=ROUND_HALF_UP)
+        self.by_rate[rate] = self.by_rate.get(rate, ZERO) + total
+        self.count += 1
+        return quantity, price, rate, total
+
+    def extend(self, items):
+        return [self.add(item) for item in items]
+
+    @property
+    def net(self):
+        return sum(self.by_rate.values(), ZERO)
+
+    def summary(self):
+        return vat_summary(self.by_rate)
+
+    @property
+    def vat(self):
+        return sum((line["vat"] for line in self.summary()), ZERO)
+
+    @property
+    def gross(self):
+        return self.net + self.vat
@@ -0,0 +1,297 @@
+#pdf_native.py
+
+import zlib
+import unicodedata
+from datetime import datetime
+
+# A4 in points
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+MARGIN = 50
+# Bump when the layout changes so cached native renders are not reused
+LAYOUT_VERSION = 2
+
+# Seller block and footer mirror the static text of templates/invoice_template.odt
+SELLER_LINES = [
+    "Company name",
+    "Street Num 63,",
+    "123456 Some City,",
+    "Some Country",
+    "OIB: 1234567890",
+    "IBAN: BR1243467455432000",
+    "SWIFT: RFWFWE453",
+]
+# Printed only on invoices without PDV
+VAT_EXEMPTION_LINE = "Oslobođeno PDV po čl. 90 st. 1 Zakona o PDV"
+FOOTER_LINES = [
+    "Poduzeće je registrirano SOMETHING pod brojem MBS 432432828. Član uprave John Doe, jedini član uprave. "
+    "Temeljni kapital 1 euro. Kontakt email: somemail@something.com",
+]
+
+# Glyph widths (1/1000 em) of the standard Helvetica fonts for ASCII 32..126
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+
+# WinAnsiEncoding covers Š/Ž but not Č/Ć/Đ; those go into codes WinAnsi leaves unused or rarely needs
+CROATIAN_CODES = {"Č": 129, "đ": 134, "č": 141, "Ć": 143, "ć": 144, "Đ": 157}
+ENCODING_DIFFERENCES = "[129 /Ccaron 134 /dcroat 141 /ccaron 143 /Cacute /cacute 157 /Dcroat]"
+SPECIAL_WIDTHS = {"Đ": 722, "đ": 556}
+
+
+def encode_text(text):
+    out = bytearray()
+    for ch in text:
+        code = CROATIAN_CODES.get(ch)
+        if code is None:
+            try:
+                code = ch.encode("cp1252")[0]
+            except UnicodeEncodeError:
+                code = ord("?")
+        if code in (0x28, 0x29, 0x5C):  # ( ) \ must be escaped inside PDF strings
+            out.append(0x5C)
+        out.append(code)
+    return bytes(out)
+
+
+def _char_width(ch, widths):
+    code = ord(ch)
+    if 32 <= code <= 126:
+        return widths[code - 32]
+    if ch in SPECIAL_WIDTHS:
+        return SPECIAL_WIDTHS[ch]
+    base = unicodedata.normalize("NFD", ch)[0]
+    if 32 <= ord(base) <= 126:
+        return widths[ord(base) - 32]
+    return 556
+
+
+def text_width(text, size, bold=False):
+    widths = HELVETICA_BOLD_WIDTHS if bold else HELVETICA_WIDTHS
+    return sum(_char_width(ch, widths) for ch in text) * size / 1000
+
+
+def wrap_text(text, width, size, bold=False):
+    """Greedy word wrap to lines no wider than `width` points."""
+    lines, current = [], ""
+    for word in str(text).split():
+        candidate = f"{current} {word}" if current else word
+        if current and text_width(candidate, size, bold) > width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    lines.append(current)
+    return lines
+
+
+class PdfDocument:
+    """Minimal PDF writer: text and lines on A4 pages using the built-in Helvetica fonts."""
+
+    def __init__(self):
+        self.pages = []
+        self.new_page()
+
+    def new_page(self):
+        self.pages.append([])
+        return len(self.pages)
+
+    @property
+    def ops(self):
+        return self.pages[-1]
+
+    def text(self, x, y, text, size=10, bold=False, align="left", page=None):
+        if align == "right":
+            x -= text_width(text, size, bold)
+        elif align == "center":
+            x -= text_width(text, size, bold) / 2
+        font = "F2" if bold else "F1"
+        ops = self.pages[page - 1] if page else self.ops
+        ops.append(b"BT /%s %.1f Tf %.2f %.2f Td (%s) Tj ET" % (
+            font.encode(), size, x, y, encode_text(text)))
+
+    def line(self, x1, y1, x2, y2, width=0.5, gray=0.6):
+        self.ops.append(b"%.2f G %.2f w %.2f %.2f m %.2f %.2f l S" % (gray, width, x1, y1, x2, y2))
+
+    def save(self, output):
+        # Objects 1 and 2 are the catalog and page tree, filled in once the pages exist
+        objects = [None, None]
+        catalog_id, pages_id = 1, 2
+
+        def add(body):
+            objects.append(body)
+            return len(objects)
+
+        encoding = f"<< /Type /Encoding /BaseEncoding /WinAnsiEncoding /Differences {ENCODING_DIFFERENCES} >>"
+        font_regular = add(f"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding {encoding} >>".encode())
+        font_bold = add(f"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding {encoding} >>".encode())
+
+        page_ids = []
+        for ops in self.pages:
+            stream = zlib.compress(b"\n".join(ops))
+            content_id = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(stream), stream))
+            page_ids.append(add((
+                f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                f"/Resources << /Font << /F1 {font_regular} 0 R /F2 {font_bold} 0 R >> >> "
+                f"/Contents {content_id} 0 R >>").encode()))
+
+        kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+        objects[catalog_id - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode()
+        objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+        info_id = add(f"<< /Producer (Billio) /CreationDate (D:{datetime.now():%Y%m%d%H%M%S}) >>".encode())
+
+        buf = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(buf))
+            buf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        xref_offset = len(buf)
+        buf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        for offset in offsets:
+            buf += b"%010d 00000 n \n" % offset
+        buf += (b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                % (len(objects) + 1, catalog_id, info_id, xref_offset))
+
+        if hasattr(output, "write"):
+            output.write(buf)
+        else:
+            with open(output, "wb") as f:
+                f.write(buf)
+
+
+def format_quantity(quantity):
+    try:
+        value = float(quantity)
+    except (TypeError, ValueError):
+        return str(quantity)
+    if value.is_integer():
+        return str(int(value))
+    return f"{value:.3f}".rstrip("0").replace(".", ",")
+
+
+# Items table column edges: name | quantity | unit price | line total
+COL_NAME = MARGIN
+COL_QTY_RIGHT = 360
+COL_PRICE_RIGHT = 450
+COL_TOTAL_RIGHT = PAGE_WIDTH - MARGIN
+NAME_WIDTH = 250
+ROW_SIZE = 9
+ROW_LEADING = 12
+BOTTOM_LIMIT = MARGIN + 40
+
+
+def _items_header(doc, y):
+    doc.text(COL_NAME, y, "USLUGA", 9, bold=True)
+    doc.text(COL_QTY_RIGHT, y, "KOM", 9, bold=True, align="right")
+    doc.text(COL_PRICE_RIGHT, y, "CIJENA", 9, bold=True, align="right")
+    doc.text(COL_TOTAL_RIGHT, y, "UKUPNO", 9, bold=True, align="right")
+    doc.line(MARGIN, y - 5, PAGE_WIDTH - MARGIN, y - 5)
+    return y - 20
+
+
+def render_invoice_pdf_native(context, output):
+    """Lay out an invoice context (client block, items table, totals) straight to PDF."""
+    doc = PdfDocument()
+    top = PAGE_HEIGHT - MARGIN
+
+    y = top
+    for i, line in enumerate(SELLER_LINES):
+        doc.text(MARGIN, y, line, 11 if i == 0 else 9, bold=(i == 0))
+        y -= 13
+
+    right = PAGE_WIDTH - MARGIN
+    title = f"{context.get('invoice_type', '')} račun".strip().capitalize()
+    doc.text(right, top, title, 16, bold=True, align="right")
+    meta = [
+        f"Račun br.: {context.get('invoice_number', '')}",
+        f"Datum računa: {context.get('invoice_date', '')}",
+        f"Mjesto izdavanja računa: {context.get('location', '').upper()}",
+        f"Dospjeće plaćanja: {context.get('due_date_desc', '')}",
+    ]
+    meta_y = top - 22
+    for line in meta:
+        doc.text(right, meta_y, line, 9, align="right")
+        meta_y -= 13
+
+    y = min(y, meta_y) - 20
+    doc.text(MARGIN, y, "Kupac:", 9, bold=True)
+    y -= 14
+    client_lines = [
+        (context.get("client_name", ""), True),
+        (f"OIB: {context.get('oib', '')}", False),
+        (context.get("address", ""), False),
+        (f"{context.get('postal_code', '')} {context.get('city', '')}".strip(), False),
+    ]
+    for line, bold in client_lines:
+        doc.text(MARGIN, y, line, 10, bold=bold)
+        y -= 13
+
+    y = _items_header(doc, y - 20)
+    for item in context.get("items", []):
+        name_lines = wrap_text(item["name"], NAME_WIDTH, ROW_SIZE)
+        row_height = ROW_LEADING * len(name_lines)
+        if y - row_height < BOTTOM_LIMIT:
+            doc.new_page()
+            y = _items_header(doc, top)
+
+        doc.text(COL_QTY_RIGHT, y, format_quantity(item["quantity"]), ROW_SIZE, align="right")
+        doc.text(COL_PRICE_RIGHT, y, item["formatted_unit_price"], ROW_SIZE, align="right")
+        doc.text(COL_TOTAL_RIGHT, y, f"{item['formatted_line_total']} EUR", ROW_SIZE, align="right")
+        for line in name_lines:
+            doc.text(COL_NAME, y, line, ROW_SIZE)
+            y -= ROW_LEADING
+        y -= 4
+
+    # Same breakdown as the ODT template: one row of base, PDV and gross per rate
+    vat_lines = list(context.get("vat_summary", [])) if context.get("vat_total") else []
+    footer_texts = FOOTER_LINES if vat_lines else [VAT_EXEMPTION_LINE] + FOOTER_LINES
+    footer = [line for text in footer_texts for line in wrap_text(text, PAGE_WIDTH - 2 * MARGIN, 8)]
+    vat_height = 20 + ROW_LEADING * (len(vat_lines) + 1) if vat_lines else 0
+    if y - 30 - vat_height - 11 * len(footer) < MARGIN:
+        doc.new_page()
+        y = top
+
+    doc.line(MARGIN, y + 6, PAGE_WIDTH - MARGIN, y + 6)
+    y -= 10
+    doc.text(COL_PRICE_RIGHT, y, "UKUPNO", 10, bold=True, align="right")
+    doc.text(COL_TOTAL_RIGHT, y, f"{context.get('formatted_total', '')} EUR", 10, bold=True, align="right")
+
+    if vat_lines:
+        y -= 20
+        doc.text(COL_NAME, y, "PDV", 9, bold=True)
+        doc.text(COL_QTY_RIGHT, y, "OSNOVICA", 9, bold=True, align="right")
+        doc.text(COL_PRICE_RIGHT, y, "IZNOS PDV", 9, bold=True, align="right")
+        doc.text(COL_TOTAL_RIGHT, y, "UKUPNO", 9, bold=True, align="right")
+        for line in vat_lines:
+            y -= ROW_LEADING
+            doc.text(COL_NAME, y, f"PDV {line['formatted_rate']} %", ROW_SIZE)
+            doc.text(COL_QTY_RIGHT, y, f"{line['formatted_base']} EUR", ROW_SIZE, align="right")
+            doc.text(COL_PRICE_RIGHT, y, f"{line['formatted_vat']} EUR", ROW_SIZE, align="right")
+            doc.text(COL_TOTAL_RIGHT, y, f"{line['formatted_gross']} EUR", ROW_SIZE, align="right")
+
+    y -= 30
+    for line in footer:
+        doc.text(MARGIN, y, line, 8)
+        y -= 11
+
+    total_pages = len(doc.pages)
+    if total_pages > 1:
+        for number in range(1, total_pages + 1):
+            doc.text(PAGE_WIDTH - MARGIN, MARGIN / 2, f"Stranica {number}/{total_pages}", 8,
+                     align="right", page=number)
+
+    doc.save(output)
+    return output
@@ -0,0 +1,274 @@
+#recurring_invoices.py
+
+import sys
+import json
+import argparse
+import calendar
+from datetime import date, datetime, timedelta
+
+from address_index import DATABASE_DIR, normalize_name
+from atomic_files import atomic_open
+from money import InvoiceTotals
+from utilis import OUTPUT_DIR, TEMPLATE_PATH, PDF_BACKENDS, DEFAULT_PDF_BACKEND
+from invoice_archive import ensure_index, load_invoice_context, search_invoices
+from batch_generator import CLIENT_FIELDS, generate_batch
+
+# Kept next to klijenti.json
+RECURRING_PATH = DATABASE_DIR / "ponavljajuci_racuni.json"
+INTERVAL_MONTHS = {"monthly": 1, "quarterly": 3}
+ITEM_FIELDS = ("name", "quantity", "unit_price", "vat_rate")
+# A run more than this many periods behind is probably a wrong start date; the rest wait for the next run
+MAX_CATCH_UP = 12
+
+
+def load_templates(path=RECURRING_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def save_templates(templates, path=RECURRING_PATH):
+    with atomic_open(path, "w", encoding="utf-8") as f:
+        json.dump(templates, f, ensure_ascii=False, indent=2)
+
+
+def parse_period(text):
+    """'2025-03' -> (2025, 3)."""
+    year, month = (int(part) for part in text.split("-"))
+    if not 1 <= month <= 12:
+        raise ValueError(f"Not a period: {text!r}")
+    return year, month
+
+
+def add_months(year, month, months):
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def period_label(year, month, interval):
+    """How the period is written on the invoice: '03/2025', or '01-03/2025' for a quarter."""
+    last_month = month + INTERVAL_MONTHS[interval] - 1
+    return f"{month:02d}/{year}" if last_month == month else f"{month:02d}-{last_month:02d}/{year}"
+
+
+def _run_date(year, month, day):
+    # Day 31 on a short month is dated the month's last day
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+def due_runs(template, today):
+    """Periods of a template that should have been invoiced by `today`, oldest first.
+
+    Starts after `last_period` (or at `start`), so periods missed while nobody
+    ran the scheduler are caught up.
+    """
+    step = INTERVAL_MONTHS[template.get("interval", "monthly")]
+    day = int(template.get("day", 1))
+    if template.get("last_period"):
+        year, month = add_months(*parse_period(template["last_period"]), step)
+    else:
+        year, month = parse_period(template["start"])
+    end = parse_period(template["end"]) if template.get("end") else None
+
+    runs = []
+    while (year, month) <= (today.year, today.month) and (end is None or (year, month) <= end):
+        run_date = _run_date(year, month, day)
+        if run_date > today:
+            break
+        period_end = _run_date(*add_months(year, month, step), 1) - timedelta(days=1)
+        runs.append({"period": f"{year:04d}-{month:02d}", "invoice_date": run_date,
+                     "period_start": date(year, month, 1), "period_end": period_end})
+        year, month = add_months(year, month, step)
+    return runs
+
+
+def invoice_for_run(template, run):
+    """The batch_generator invoice dict for one run of a template."""
+    label = period_label(run["period_start"].year, run["period_start"].month, template.get("interval", "monthly"))
+    invoice = {field: template.get(field, "") for field in CLIENT_FIELDS}
+    invoice["items"] = [
+        {**{key: item[key] for key in ITEM_FIELDS if key in item}, "name": item["name"].replace("{period}", label)}
+        for item in template["items"]
+    ]
+    invoice_date = run["invoice_date"]
+    invoice["invoice_date"] = invoice_date.isoformat()
+    invoice["due_date"] = (invoice_date + timedelta(days=int(template.get("due_days", 7)))).isoformat()
+    for key in ("invoice_type", "invoice_time", "location"):
+        if template.get(key):
+            invoice[key] = template[key]
+    return invoice
+
+
+def template_total(template):
+    totals = InvoiceTotals()
+    totals.extend(template["items"])
+    return float(totals.gross)
+
+
+def already_issued(template, run, output_dir=OUTPUT_DIR):
+    """True if the archive has an invoice to the same client, for the same total, within the period.
+
+    This also catches periods that were invoiced by hand from the GUI.
+    """
+    expected = template_total(template)
+    oib = template.get("oib") or None
+    rows = search_invoices(text=None if oib else template["client_name"], oib=oib,
+                           date_from=run["period_start"].isoformat(), date_to=run["period_end"].isoformat(),
+                           limit=-1, output_dir=output_dir)
+    name = normalize_name(template["client_name"])
+    return any(abs((row["total"] or 0) - expected) < 0.005
+               and (oib or normalize_name(row["client_name"]) == name) for row in rows)
+
+
+def plan_runs(templates, today, output_dir=OUTPUT_DIR):
+    """Due runs of all active templates, minus those the archive already has.
+
+    Returns (runs to generate, runs skipped as already issued). Each run dict
+    carries its template id, period and the invoice to generate.
+    """
+    ensure_index(output_dir)
+    planned, skipped = [], []
+    for template in templates:
+        if not template.get("active", True):
+            continue
+        runs = due_runs(template, today)
+        if len(runs) > MAX_CATCH_UP:
+            print(f"⚠️ {template['id']}: {len(runs)} periods due, generating the first {MAX_CATCH_UP}")
+            runs = runs[:MAX_CATCH_UP]
+        for run in runs:
+            run["template_id"] = template["id"]
+            run["invoice"] = invoice_for_run(template, run)
+            (skipped if already_issued(template, run, output_dir) else planned).append(run)
+    return planned, skipped
+
+
+def _advance_last_periods(templates, runs):
+    """Move each template's last_period past its leading run of done periods.
+
+    A failed period stops the template there, so the next run retries it.
+    """
+    by_template = {}
+    for run in sorted(runs, key=lambda r: r["period"]):
+        by_template.setdefault(run["template_id"], []).append(run)
+    for template in templates:
+        for run in by_template.get(template["id"], ()):
+            if not run["done"]:
+                break
+            template["last_period"] = run["period"]
+
+
+def run_due(today=None, output_dir=OUTPUT_DIR, path=RECURRING_PATH, backend=DEFAULT_PDF_BACKEND,
+            template_path=TEMPLATE_PATH, dry_run=False):
+    """Generate every due recurring invoice in one batch. Returns (planned, skipped, summary)."""
+    today = today or date.today()
+    templates = load_templates(path)
+    planned, skipped = plan_runs(templates, today, output_dir)
+    if dry_run:
+        return planned, skipped, None
+
+    summary = None
+    if planned:
+        results, summary = generate_batch([run["invoice"] for run in planned], output_dir, template_path,
+                                          backend=backend)
+        for run, record in zip(planned, results):
+            run["record"] = record
+            run["done"] = record["status"] == "ok"
+    for run in skipped:
+        run["done"] = True
+
+    if planned or skipped:
+        _advance_last_periods(templates, planned + skipped)
+        save_templates(templates, path)
+    return planned, skipped, summary
+
+
+def template_from_invoice(invoice_number, year=None, output_dir=OUTPUT_DIR):
+    """Template fields (client and items) copied from an archived invoice."""
+    ensure_index(output_dir)
+    matches = [row for row in search_invoices(text=invoice_number, year=year, limit=-1, output_dir=output_dir)
+               if row["invoice_number"] == invoice_number]
+    if not matches:
+        raise ValueError(f"No archived invoice {invoice_number}")
+    context = load_invoice_context(matches[0])
+    template = {field: context.get(field, "") for field in CLIENT_FIELDS}
+    template["items"] = [{key: item[key] for key in ITEM_FIELDS if key in item} for item in context["items"]]
+    for key in ("invoice_type", "location"):
+        if context.get(key):
+            template[key] = context[key]
+    return template
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Issue recurring invoices that are due.")
+    parser.add_argument("--file", default=str(RECURRING_PATH), help="recurring invoice templates (JSON)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="show templates and their next due period")
+
+    run_cmd = sub.add_parser("run", help="generate every due invoice, catching up missed periods")
+    run_cmd.add_argument("--date", help="run as of this date (YYYY-MM-DD); default today")
+    run_cmd.add_argument("--dry-run", action="store_true", help="only show what would be generated")
+    run_cmd.add_argument("--backend", choices=PDF_BACKENDS, default=DEFAULT_PDF_BACKEND)
+    run_cmd.add_argument("--template", default=TEMPLATE_PATH)
+
+    add_cmd = sub.add_parser("add", help="make a template from an archived invoice")
+    add_cmd.add_argument("id", help="short name for the template")
+    add_cmd.add_argument("--from-invoice", required=True, help="invoice number, e.g. 12/2/2")
+    add_cmd.add_argument("--year", help="year of that invoice, if the number repeats across years")
+    add_cmd.add_argument("--interval", choices=INTERVAL_MONTHS, default="monthly")
+    add_cmd.add_argument("--day", type=int, default=1, help="day of the month invoices are dated")
+    add_cmd.add_argument("--start", required=True, help="first period to invoice, YYYY-MM")
+    add_cmd.add_argument("--due-days", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        today = date.today()
+        for template in load_templates(args.file):
+            runs = due_runs(template, today)
+            state = "inactive" if not template.get("active", True) else f"{len(runs)} due"
+            print(f"{template['id']}: {template['client_name']} ({template.get('interval', 'monthly')}, "
+                  f"last {template.get('last_period') or '-'}, {state})")
+        return 0
+
+    if args.command == "add":
+        templates = load_templates(args.file)
+        if any(t["id"] == args.id for t in templates):
+            print(f"❌ Template {args.id} already exists")
+            return 1
+        parse_period(args.start)
+        try:
+            template = template_from_invoice(args.from_invoice, args.year, args.output_dir)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        templates.append({"id": args.id, **template, "interval": args.interval, "day": args.day,
+                          "start": args.start, "due_days": args.due_days, "active": True})
+        save_templates(templates, args.file)
+        print(f"✅ Template {args.id} saved: {template['client_name']}, {template_total(template):.2f} EUR")
+        return 0
+
+    today = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else date.today()
+    planned, skipped, summary = run_due(today, args.output_dir, args.file, args.backend, args.template,
+                                        dry_run=args.dry_run)
+    for run in skipped:
+        print(f"   ⏭️ {run['template_id']} {run['period']}: already in the archive")
+    for run in planned:
+        record = run.get("record")
+        if record is None:
+            print(f"   📝 {run['template_id']} {run['period']}: {run['invoice']['invoice_date']}")
+        elif record["status"] == "ok":
+            print(f"   ✅ {run['template_id']} {run['period']}: {record['invoice_number']}")
+        else:
+            print(f"   ❌ {run['template_id']} {run['period']}: {record.get('stage')} - {record.get('error')}")
+    if summary is None:
+        print(f"✅ {len(planned)} invoices due, {len(skipped)} already issued")
+        return 0
+    print(f"✅ {summary['succeeded']}/{summary['total']} recurring invoices in {summary['elapsed_s']} s")
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
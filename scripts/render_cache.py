@@ -0,0 +1,181 @@
+#render_cache.py
+
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+
+from atomic_files import atomic_copy
+
+DEFAULT_MAX_BYTES = int(os.environ.get("BILLIO_RENDER_CACHE_MB", "200")) * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    has_odt INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+_file_hashes = {}
+
+
+def file_hash(path):
+    """sha256 of a file, memoized per path and mtime."""
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    cached = _file_hashes.get(key)
+    if cached and cached[0] == stat.st_mtime_ns:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(key, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    _file_hashes[key] = (stat.st_mtime_ns, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def context_key(context, backend, template_hash):
+    """Content address of a render: the normalized context plus what it was rendered with."""
+    normalized = json.dumps(context, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    digest = hashlib.sha256()
+    digest.update(f"{backend}\0{template_hash}\0".encode())
+    digest.update(normalized.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """Size-bounded LRU store of rendered invoice PDFs (and their ODTs), keyed by content hash."""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.cache_dir / "index.sqlite"), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _paths(self, key):
+        folder = self.cache_dir / key[:2]
+        return folder / f"{key}.pdf", folder / f"{key}.odt"
+
+    @staticmethod
+    def _bump(conn, name, amount=1):
+        conn.execute("INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?",
+                     (name, amount, amount))
+
+    def get(self, key, pdf_dest, odt_dest=None):
+        """Copy a cached render to the destination paths. Returns True on a hit."""
+        pdf_path, odt_path = self._paths(key)
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT has_odt FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None or not pdf_path.exists() or (odt_dest and not row[0]):
+                    self._bump(conn, "misses")
+                    return False
+                shutil.copyfile(pdf_path, pdf_dest)
+                if odt_dest:
+                    shutil.copyfile(odt_path, odt_dest)
+                conn.execute("UPDATE entries SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+                self._bump(conn, "hits")
+                return True
+            finally:
+                conn.close()
+
+    def put(self, key, pdf_src, odt_src=None):
+        pdf_path, odt_path = self._paths(key)
+        pdf_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            # Other processes may be reading the same entry; never let them see a partial copy
+            atomic_copy(pdf_src, pdf_path, sync=False)
+            size = pdf_path.stat().st_size
+            if odt_src:
+                atomic_copy(odt_src, odt_path, sync=False)
+                size += odt_path.stat().st_size
+            now = time.time()
+            conn = self._connect()
+            try:
+                conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, 0)",
+                             (key, size, 1 if odt_src else 0, now, now))
+                self._evict(conn)
+            finally:
+                conn.close()
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                if path.exists():
+                    path.unlink()
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._bump(conn, "evictions", evicted)
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            counters = dict(conn.execute("SELECT name, value FROM counters"))
+        finally:
+            conn.close()
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    from utilis import get_render_cache, OUTPUT_DIR
+
+    parser = argparse.ArgumentParser(description="Inspect or clear the rendered invoice cache.")
+    parser.add_argument("command", choices=("stats", "clear"))
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    args = parser.parse_args(argv)
+
+    cache = get_render_cache(args.output_dir)
+    if args.command == "stats":
+        stats = cache.stats()
+        print(f"📦 {stats['entries']} entries, {stats['bytes'] / 1048576:.1f} / "
+              f"{stats['max_bytes'] / 1048576:.0f} MB")
+        print(f"🎯 {stats['hits']} hits, {stats['misses']} misses (hit rate {stats['hit_rate']:.0%}), "
+              f"{stats['evictions']} evictions")
+    else:
+        cache.clear()
+        print("🧹 Render cache cleared")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+#soffice_pool.py
+
+import os
+import sys
+import time
+import queue
+import shutil
+import atexit
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import stage, say, METRICS
+
+# The UNO bridge ships with LibreOffice's own Python; when it's not importable
+# the pool falls back to one-shot `soffice --convert-to` runs per worker.
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    HAS_UNO = True
+except ImportError:
+    HAS_UNO = False
+
+MAC_SOFFICE_PATH = "/Applications/LibreOffice.app/Contents/MacOS/soffice"
+DEFAULT_JOB_TIMEOUT = 30
+STARTUP_TIMEOUT = 30
+# Idle workers whose soffice died are restarted this often, not only when the next job arrives
+HEALTH_CHECK_INTERVAL = float(os.environ.get("BILLIO_SOFFICE_HEALTH_S", 60))
+
+
+class ConversionError(Exception):
+    pass
+
+
+@lru_cache(maxsize=1)
+def find_soffice():
+    """Locate the soffice binary once and verify it runs."""
+    candidates = [shutil.which("soffice"), shutil.which("libreoffice")]
+    if sys.platform == "darwin":
+        candidates.append(MAC_SOFFICE_PATH)
+
+    for candidate in candidates:
+        if not candidate or not os.path.exists(candidate):
+            continue
+        try:
+            subprocess.run([candidate, "--version"], capture_output=True, check=True, timeout=DEFAULT_JOB_TIMEOUT)
+            return candidate
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+            continue
+    raise ConversionError("LibreOffice (soffice) not found")
+
+
+def _uno_props(**kwargs):
+    props = []
+    for name, value in kwargs.items():
+        prop = PropertyValue()
+        prop.Name = name
+        prop.Value = value
+        props.append(prop)
+    return tuple(props)
+
+
+class SofficeWorker:
+    """One headless LibreOffice instance with its own user profile."""
+
+    def __init__(self, index, soffice_bin, job_timeout=DEFAULT_JOB_TIMEOUT):
+        self.index = index
+        self.soffice_bin = soffice_bin
+        self.job_timeout = job_timeout
+        self.profile_dir = tempfile.mkdtemp(prefix=f"billio-soffice-{index}-")
+        self.pipe_name = f"billio_{os.getpid()}_{index}"
+        self.process = None
+        self.desktop = None
+        self.jobs_done = 0
+
+    @property
+    def profile_url(self):
+        return Path(self.profile_dir).as_uri()
+
+    def start(self):
+        if not HAS_UNO:
+            return  # CLI mode: nothing to keep running between jobs
+        with stage("soffice_startup", worker=self.index):
+            self._start()
+
+    def _start(self):
+        self.process = subprocess.Popen([
+            self.soffice_bin,
+            f"-env:UserInstallation={self.profile_url}",
+            "--headless", "--invisible", "--nologo", "--nodefault",
+            "--norestore", "--nolockcheck",
+            f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext",
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_ctx)
+
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            try:
+                ctx = resolver.resolve(f"uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext")
+                self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+                say(f"🟢 LibreOffice worker {self.index} ready")
+                return
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise ConversionError(f"LibreOffice worker {self.index} failed to start")
+                time.sleep(0.25)
+
+    def stop(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+    def restart(self):
+        print(f"🔁 Restarting LibreOffice worker {self.index}")
+        METRICS.inc("billio_soffice_restarts_total")
+        self.stop()
+        self.start()
+
+    def is_healthy(self):
+        if not HAS_UNO:
+            return True
+        if self.process is None or self.process.poll() is not None or self.desktop is None:
+            return False
+        try:
+            self.desktop.getCurrentComponent()
+            return True
+        except Exception:
+            return False
+
+    def ensure_running(self):
+        if not self.is_healthy():
+            if self.process is None:
+                self.start()
+            else:
+                self.restart()
+
+    def convert(self, odt_path, output_dir, timeout=None):
+        timeout = timeout or self.job_timeout
+        pdf_name = os.path.splitext(os.path.basename(odt_path))[0] + ".pdf"
+        pdf_path = os.path.join(output_dir, pdf_name)
+
+        with stage("soffice_convert", worker=self.index, mode="uno" if HAS_UNO else "cli"):
+            if HAS_UNO:
+                self._convert_uno(odt_path, pdf_path, timeout)
+            else:
+                self._convert_cli(odt_path, output_dir, timeout)
+
+        if not os.path.exists(pdf_path):
+            raise ConversionError(f"PDF was not created: {pdf_path}")
+        self.jobs_done += 1
+        return pdf_path
+
+    def _convert_uno(self, odt_path, pdf_path, timeout):
+        self.ensure_running()
+
+        # A hung document blocks the UNO call; killing the process unblocks it.
+        timed_out = threading.Event()
+
+        def on_timeout():
+            timed_out.set()
+            if self.process is not None:
+                self.process.kill()
+
+        timer = threading.Timer(timeout, on_timeout)
+        timer.start()
+        try:
+            doc = self.desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(os.path.abspath(odt_path)), "_blank", 0,
+                _uno_props(Hidden=True, ReadOnly=True))
+            try:
+                doc.storeToURL(uno.systemPathToFileUrl(os.path.abspath(pdf_path)),
+                               _uno_props(FilterName="writer_pdf_Export"))
+            finally:
+                doc.close(True)
+        except Exception as e:
+            # A bad document leaves the process usable; the health check probes the bridge before the next job
+            if timed_out.is_set() or self.process is None or self.process.poll() is not None:
+                self.desktop = None  # force a restart before the next job
+            if timed_out.is_set():
+                raise ConversionError(f"LibreOffice conversion timed out after {timeout}s")
+            raise ConversionError(f"LibreOffice conversion failed: {e}")
+        finally:
+            timer.cancel()
+
+    def _convert_cli(self, odt_path, output_dir, timeout):
+        # Each worker owns its profile, so several one-shot runs can overlap.
+        try:
+            result = subprocess.run([
+                self.soffice_bin,
+                f"-env:UserInstallation={self.profile_url}",
+                "--headless",
+                "--convert-to", "pdf",
+                "--outdir", output_dir,
+                odt_path
+            ], capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise ConversionError(f"LibreOffice conversion timed out after {timeout}s")
+
+        if result.returncode != 0:
+            raise ConversionError(
+                f"LibreOffice exit code {result.returncode}: {result.stderr.strip()}")
+
+    def close(self):
+        self.stop()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+class SofficePool:
+    """A fixed set of warm LibreOffice workers that conversions are queued onto."""
+
+    def __init__(self, size=None, job_timeout=DEFAULT_JOB_TIMEOUT, soffice_bin=None,
+                 health_interval=HEALTH_CHECK_INTERVAL):
+        self.size = size or default_pool_size()
+        self.job_timeout = job_timeout
+        self.soffice_bin = soffice_bin or find_soffice()
+        self.workers = [SofficeWorker(i, self.soffice_bin, job_timeout) for i in range(self.size)]
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="soffice")
+        self._closed = False
+        self._stop_health = threading.Event()
+        # One-shot CLI workers keep no process between jobs, so there's nothing to watch
+        if HAS_UNO and health_interval > 0:
+            threading.Thread(target=self._health_loop, args=(health_interval,),
+                             name="soffice-health", daemon=True).start()
+
+    def warm_up(self):
+        """Start every worker in the background so the first job doesn't pay startup."""
+        for _ in self.workers:
+            self._executor.submit(self._run_on_worker, lambda w: w.ensure_running())
+
+    def _run_on_worker(self, fn):
+        with stage("soffice_queue_wait"):
+            worker = self._idle.get()
+        try:
+            return fn(worker)
+        finally:
+            self._idle.put(worker)
+
+    def submit(self, odt_path, output_dir, timeout=None):
+        if self._closed:
+            raise ConversionError("Conversion pool is shut down")
+        return self._executor.submit(
+            self._run_on_worker, lambda w: w.convert(odt_path, output_dir, timeout))
+
+    def convert(self, odt_path, output_dir, timeout=None):
+        return self.submit(odt_path, output_dir, timeout).result()
+
+    def health_check(self):
+        """Restart any idle worker whose LibreOffice process has died."""
+        restarted = 0
+        for _ in range(self.size):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if worker.process is not None and not worker.is_healthy():
+                    worker.restart()
+                    restarted += 1
+            finally:
+                self._idle.put(worker)
+        return restarted
+
+    def _health_loop(self, interval):
+        while not self._stop_health.wait(interval):
+            try:
+                self.health_check()
+            except Exception as e:
+                print(f"⚠️ LibreOffice health check failed: {e}")
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._stop_health.set()
+        self._executor.shutdown(wait=True)
+        for worker in self.workers:
+            worker.close()
+
+
+def default_pool_size():
+    env_size = os.environ.get("BILLIO_SOFFICE_WORKERS")
+    if env_size:
+        return max(1, int(env_size))
+    return max(1, min(4, (os.cpu_count() or 2) // 2))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_conversion_pool():
+    """Return the process-wide conversion pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SofficePool()
+            atexit.register(_pool.shutdown)
+        return _pool
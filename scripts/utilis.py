@@ -1,99 +1,552 @@
 #utilis.py
 
+import io
 import os
+import copy
+import re
+import time
+import struct
+import sqlite3
 import zipfile
-import shutil
-import subprocess
-from jinja2 import Template
+from datetime import timedelta
+from jinja2 import Environment, BaseLoader, FileSystemBytecodeCache, TemplateNotFound
 from pathlib import Path
 
+from soffice_pool import get_conversion_pool, ConversionError
+from pdf_native import render_invoice_pdf_native, LAYOUT_VERSION
+from render_cache import RenderCache, context_key, file_hash
+from instrumentation import stage, say, METRICS
+from money import InvoiceTotals, format_amount, format_rate, to_decimal
+
 # === Path Setup ===
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 TEMPLATE_PATH = os.path.join(BASE_DIR, 'templates', 'invoice_template.odt')
 OUTPUT_DIR = os.path.join(BASE_DIR, 'output')
+ODT_MIMETYPE = "application/vnd.oasis.opendocument.text"
+JINJA_CACHE_DIR = os.path.join(OUTPUT_DIR, '._cache', 'jinja')
+JINJA_MEMBERS = ("content.xml", "styles.xml")
+# Jinja output chunks collected before each write into a streamed zip member
+STREAM_BUFFER_CHUNKS = 256
+# "libreoffice" renders the ODT template for exact fidelity; "native" lays the PDF out in-process
+PDF_BACKENDS = ("libreoffice", "native")
+DEFAULT_PDF_BACKEND = os.environ.get("BILLIO_PDF_BACKEND", "libreoffice")
+# Archived names start with the sequence number: "5-2-2 - name.pdf" or "5-2-2_name.pdf"
+INVOICE_FILE_NUMBER_RE = re.compile(r"(\d+)-")
+
+def output_cache_dir(output_dir, name):
+    """Cache directory that belongs to an output directory, e.g. output/._cache/render."""
+    return os.path.join(output_dir, '._cache', name)
 
 def round_down_hour(dt):
     return dt.replace(minute=0, second=0, microsecond=0)
 
-def render_odt_template(template_path, output_odt_path, context):
-    temp_dir = os.path.join(os.path.dirname(output_odt_path), "temp_odt")
-    if os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
-    os.makedirs(temp_dir)
+def format_currency(amount):
+    return format_amount(amount)
 
-    try:
-        with zipfile.ZipFile(template_path, 'r') as zin:
-            zin.extractall(temp_dir)
+def parse_number(text):
+    """Parse a Croatian-formatted number such as '1 234,50'."""
+    if isinstance(text, (int, float)):
+        return float(text)
+    return float(to_decimal(text))
+
+def _context_item(item, totals):
+    # Amounts are exact Decimals rounded to the cent; the context keeps floats so it stays JSON-friendly
+    qty, price, rate, line_total = totals.add(item)
+    return {
+        "name": item["name"],
+        "quantity": float(qty),
+        "unit_price": float(price),
+        "vat_rate": float(rate),
+        "line_total": float(line_total),
+        "formatted_unit_price": format_amount(price),
+        "formatted_line_total": format_amount(line_total),
+    }
+
+def _vat_summary_context(totals):
+    return [{
+        "rate": float(line["rate"]),
+        "base": float(line["base"]),
+        "vat": float(line["vat"]),
+        "gross": float(line["gross"]),
+        "formatted_rate": format_rate(line["rate"]),
+        "formatted_base": format_amount(line["base"]),
+        "formatted_vat": format_amount(line["vat"]),
+        "formatted_gross": format_amount(line["gross"]),
+    } for line in totals.summary()]
+
+def build_invoice_context(client, items, invoice_number, invoice_date, invoice_time=None,
+                          due_date=None, invoice_type="", location="Rijeka"):
+    """Build the template context from client fields and raw name/quantity/unit_price items."""
+    invoice_time = invoice_time or invoice_date.time()
+    due_date = due_date or invoice_date + timedelta(days=7)
+
+    totals = InvoiceTotals()
+    context_items = [_context_item(item, totals) for item in items]
+
+    return {
+        "client_name": client.get("client_name", ""),
+        "oib": client.get("oib", ""),
+        "address": client.get("address", ""),
+        "postal_code": client.get("postal_code", ""),
+        "city": client.get("city", ""),
+        "invoice_type": invoice_type,
+        "invoice_number": invoice_number,
+        "invoice_date": invoice_date.strftime("%d.%m.%Y") + " " + invoice_time.strftime("%H:%M"),
+        "invoice_time": invoice_time.strftime("%H:%M"),
+        "due_date": due_date.strftime("%d.%m.%Y"),
+        "due_date_desc": due_date.strftime("%d.%m.%Y"),
+        "location": location,
+        "items": context_items,
+        "net_total": float(totals.net),
+        "vat_total": float(totals.vat),
+        "vat_summary": _vat_summary_context(totals),
+        "total": float(totals.gross),
+        "formatted_total": format_amount(totals.gross),
+    }
+
+class RunningTotal(InvoiceTotals):
+    """Invoice total summed while streamed items are rendered.
+
+    Renders as the formatted gross total so far; the template prints the total
+    after the item loop, so by then every line has been added.
+    """
+
+    def __float__(self):
+        return float(self.gross)
+
+    def __str__(self):
+        return format_amount(self.gross)
+
+class RunningVat:
+    """PDV of a RunningTotal so far; true once any streamed line carries PDV."""
+
+    def __init__(self, totals):
+        self.totals = totals
+
+    def __bool__(self):
+        return bool(self.totals.vat)
+
+    def __float__(self):
+        return float(self.totals.vat)
+
+    def __str__(self):
+        return format_amount(self.totals.vat)
+
+class RunningVatSummary(RunningVat):
+    """Per-rate PDV breakdown of a RunningTotal, built when the template iterates it."""
+
+    def __iter__(self):
+        return iter(_vat_summary_context(self.totals))
+
+def stream_context_items(items, running_total):
+    """Format raw items one at a time, adding each line to `running_total`."""
+    for item in items:
+        yield _context_item(item, running_total)
+
+def build_streaming_context(client, items, invoice_number, invoice_date, **kwargs):
+    """Like build_invoice_context, but `items` may be any iterator and is consumed lazily.
+
+    The returned context can be rendered once (render_odt_template with
+    stream=True, or render_native_pdf); afterwards its totals and VAT summary
+    hold the final sums. It can't go through the render cache or the archive.
+    """
+    context = build_invoice_context(client, [], invoice_number, invoice_date, **kwargs)
+    running_total = RunningTotal()
+    context["items"] = stream_context_items(items, running_total)
+    context["total"] = running_total
+    context["formatted_total"] = running_total
+    # Printed after the item loop, like the total
+    context["vat_total"] = RunningVat(running_total)
+    context["vat_summary"] = RunningVatSummary(running_total)
+    return context
+
+def is_streaming_context(context):
+    return not isinstance(context.get("items", []), list)
+
+def finish_streaming_context(context):
+    """Replace the running total of a rendered streaming context with the final sums."""
+    totals = context["total"]
+    if not isinstance(totals, RunningTotal):
+        return context
+    context.update({
+        "net_total": float(totals.net),
+        "vat_total": float(totals.vat),
+        "vat_summary": _vat_summary_context(totals),
+        "total": float(totals.gross),
+        "formatted_total": format_amount(totals.gross),
+    })
+    return context
+
+# Parsed templates keyed by absolute path; reloaded when the file's mtime or size changes
+_odt_template_cache = {}
+
+def _read_raw_member(f, info):
+    """Return a member's compressed bytes exactly as stored in the zip."""
+    f.seek(info.header_offset)
+    local_header = f.read(30)
+    name_len, extra_len = struct.unpack("<HH", local_header[26:30])
+    f.seek(info.header_offset + 30 + name_len + extra_len)
+    return f.read(info.compress_size)
+
+def load_odt_template(template_path):
+    """Read an ODT template once, keeping every non-Jinja member pre-compressed."""
+    key = os.path.abspath(template_path)
+    stat = os.stat(key)
+    cached = _odt_template_cache.get(key)
+    if cached and cached["mtime"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+        return cached
+
+    members = []
+    sources = {}
+    with open(key, "rb") as f, zipfile.ZipFile(f) as zin:
+        for info in zin.infolist():
+            if info.filename == "mimetype":
+                continue  # always written first, uncompressed
+            if info.filename in JINJA_MEMBERS:
+                source = zin.read(info).decode("utf-8")
+                # styles.xml only goes through Jinja when headers/footers use placeholders
+                if info.filename == "content.xml" or "{{" in source or "{%" in source:
+                    sources[info.filename] = source
+                    continue
+            members.append((info, _read_raw_member(f, info)))
+
+    if "content.xml" not in sources:
+        raise ValueError(f"Template has no content.xml: {template_path}")
+
+    cached = {
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sources": sources,
+        "members": members,
+    }
+    _odt_template_cache[key] = cached
+    return cached
+
+class OdtMemberLoader(BaseLoader):
+    """Jinja loader for templates named '<odt path>::<member>', e.g. '.../invoice_template.odt::content.xml'."""
+
+    def get_source(self, environment, name):
+        odt_path, _, member = name.rpartition("::")
+        template = load_odt_template(odt_path)
+        source = template["sources"].get(member)
+        if source is None:
+            raise TemplateNotFound(name)
+        mtime = template["mtime"]
+
+        def uptodate():
+            try:
+                return os.stat(odt_path).st_mtime_ns == mtime
+            except OSError:
+                return False
+
+        return source, None, uptodate
+
+# Environments keyed by bytecode cache directory, one per output directory in use
+_jinja_envs = {}
+
+def get_jinja_environment(cache_dir=None):
+    """Shared environment that compiles each ODT member once and keeps bytecode in `cache_dir`.
+
+    Defaults to JINJA_CACHE_DIR, read at call time so it can be pointed elsewhere.
+    """
+    cache_dir = os.path.abspath(cache_dir or JINJA_CACHE_DIR)
+    env = _jinja_envs.get(cache_dir)
+    if env is None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Named apart from bytecode compiled before autoescaping, which the cache can't tell from this
+            bytecode_cache = FileSystemBytecodeCache(cache_dir, "__jinja2_xml_%s.cache")
+        except OSError as e:
+            print(f"⚠️ Jinja bytecode cache disabled: {e}")
+            bytecode_cache = None
+        # Every member is XML: "Smith & Sons" must reach content.xml as "Smith &amp; Sons"
+        env = _jinja_envs[cache_dir] = Environment(loader=OdtMemberLoader(), bytecode_cache=bytecode_cache,
+                                                   auto_reload=True, autoescape=True)
+    return env
+
+def get_compiled_template(template_path, member="content.xml", cache_dir=None):
+    return get_jinja_environment(cache_dir).get_template(f"{os.path.abspath(template_path)}::{member}")
+
+def _write_raw_member(zout, info, raw):
+    # Copy an already-compressed member without inflating and deflating it again
+    zinfo = copy.copy(info)
+    zinfo.flag_bits &= ~0x08  # sizes live in the local header, no trailing data descriptor
+    zinfo.header_offset = zout.fp.tell()
+    zout.fp.write(zinfo.FileHeader())
+    zout.fp.write(raw)
+    zout.filelist.append(zinfo)
+    zout.NameToInfo[zinfo.filename] = zinfo
+    zout.start_dir = zout.fp.tell()
+
+def render_odt(template_path, context, output=None, cache_dir=None):
+    """Render an ODT template in memory.
 
-        content_xml_path = os.path.join(temp_dir, "content.xml")
-        with open(content_xml_path, 'r', encoding='utf-8') as f:
-            content_template = Template(f.read())
+    Writes the document to `output` (a path or a binary file object), or returns
+    the document bytes when no output is given. `cache_dir` is the Jinja bytecode cache.
+    """
+    with stage("template_load"):
+        template = load_odt_template(template_path)
+    with stage("jinja_render", items=len(context.get("items", ()))):
+        rendered = {
+            member: get_compiled_template(template_path, member, cache_dir).render(context)
+            for member in template["sources"]
+        }
 
-        rendered_content = content_template.render(context)
+    target = io.BytesIO() if output is None else output
+    with stage("zip_write"), zipfile.ZipFile(target, "w") as zout:
+        # ODF requires mimetype as the first member, stored without compression
+        zout.writestr(zipfile.ZipInfo("mimetype"), ODT_MIMETYPE, compress_type=zipfile.ZIP_STORED)
+        for member, text in rendered.items():
+            zout.writestr(member, text, compress_type=zipfile.ZIP_DEFLATED)
+        for info, raw in template["members"]:
+            _write_raw_member(zout, info, raw)
 
-        with open(content_xml_path, 'w', encoding='utf-8') as f:
-            f.write(rendered_content)
+    if output is None:
+        return target.getvalue()
+    return output
 
-        shutil.make_archive(output_odt_path.replace('.odt', ''), 'zip', temp_dir)
-        os.rename(output_odt_path.replace('.odt', '') + '.zip', output_odt_path)
-        shutil.rmtree(temp_dir)
+def render_odt_streaming(template_path, context, output, cache_dir=None):
+    """Render an ODT template writing each member to the zip as Jinja produces it.
 
-        print(f"✅ ODT template rendered successfully: {output_odt_path}")
+    Used for contexts from build_streaming_context: neither the items nor the
+    rendered content.xml are ever held in memory as a whole.
+    """
+    template = load_odt_template(template_path)
+    with stage("render_stream"), zipfile.ZipFile(output, "w") as zout:
+        zout.writestr(zipfile.ZipInfo("mimetype"), ODT_MIMETYPE, compress_type=zipfile.ZIP_STORED)
+        for member in template["sources"]:
+            zinfo = zipfile.ZipInfo(member, date_time=time.localtime()[:6])
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            with zout.open(zinfo, "w") as member_file:
+                stream = get_compiled_template(template_path, member, cache_dir).stream(context)
+                stream.enable_buffering(STREAM_BUFFER_CHUNKS)
+                stream.dump(member_file, encoding="utf-8")
+        for info, raw in template["members"]:
+            _write_raw_member(zout, info, raw)
+    return output
+
+def render_odt_template(template_path, output_odt_path, context, stream=False, cache_dir=None):
+    try:
+        with stage("render_odt", invoice_number=context.get("invoice_number"), path=output_odt_path):
+            if stream:
+                render_odt_streaming(template_path, context, output_odt_path, cache_dir)
+                finish_streaming_context(context)
+            else:
+                render_odt(template_path, context, output_odt_path, cache_dir)
+        say(f"✅ ODT template rendered successfully: {output_odt_path}")
         return True
 
     except Exception as e:
         print(f"❌ Error rendering ODT template: {e}")
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+        if os.path.exists(output_odt_path):
+            os.remove(output_odt_path)
         return False
 
-def convert_to_pdf(odt_path, output_dir):
+def convert_to_pdf(odt_path, output_dir, timeout=None):
     try:
-        print(f"🔄 Converting ODT to PDF: {odt_path}")
+        say(f"🔄 Converting ODT to PDF: {odt_path}")
         if not os.path.exists(odt_path):
             raise FileNotFoundError(f"ODT file not found: {odt_path}")
 
-        subprocess.run(['soffice', '--version'], capture_output=True, check=True)
-
-        result = subprocess.run([
-            'soffice',
-            '--headless',
-            '--convert-to', 'pdf',
-            '--outdir', output_dir,
-            odt_path
-        ], capture_output=True, text=True, timeout=30)
-
-        print(f"LibreOffice exit code: {result.returncode}")
-        if result.stdout:
-            print(f"stdout: {result.stdout}")
-        if result.stderr:
-            print(f"stderr: {result.stderr}")
-
-        pdf_name = os.path.basename(odt_path).replace('.odt', '.pdf')
-        pdf_path = os.path.join(output_dir, pdf_name)
+        # Conversion runs on one of the warm LibreOffice workers instead of a cold soffice start
+        with stage("convert_pdf", path=odt_path):
+            pdf_path = get_conversion_pool().convert(odt_path, output_dir, timeout=timeout)
 
-        if not os.path.exists(pdf_path):
-            raise FileNotFoundError(f"PDF was not created: {pdf_path}")
-
-        print(f"✅ PDF created successfully: {pdf_path}")
+        say(f"✅ PDF created successfully: {pdf_path}")
         return True
 
-    except subprocess.CalledProcessError as e:
-        print(f"❌ LibreOffice conversion failed:")
-        print(f"Return code: {e.returncode}")
-        print(f"stdout: {e.stdout}")
-        print(f"stderr: {e.stderr}")
-        return False
-    except subprocess.TimeoutExpired:
-        print("❌ LibreOffice conversion timed out")
+    except ConversionError as e:
+        print(f"❌ LibreOffice conversion failed: {e}")
         return False
     except Exception as e:
         print(f"❌ Error in PDF conversion: {e}")
         return False
 
-def get_next_invoice_number(output_dir, year_str):
+def render_native_pdf(context, output_pdf_path):
+    try:
+        with stage("render_native", invoice_number=context.get("invoice_number"), path=output_pdf_path):
+            render_invoice_pdf_native(context, output_pdf_path)
+            finish_streaming_context(context)
+        say(f"✅ PDF rendered natively: {output_pdf_path}")
+        return True
+    except Exception as e:
+        print(f"❌ Error rendering PDF: {e}")
+        return False
+
+# One cache per output directory, so each archive keeps its renders under its own ._cache
+_render_caches = {}
+
+def get_render_cache(output_dir=OUTPUT_DIR):
+    cache_dir = os.path.abspath(output_cache_dir(output_dir, 'render'))
+    cache = _render_caches.get(cache_dir)
+    if cache is None:
+        cache = _render_caches[cache_dir] = RenderCache(cache_dir)
+    return cache
+
+def render_cache_key(context, backend, template_path=TEMPLATE_PATH):
+    source = f"native-{LAYOUT_VERSION}" if backend == "native" else file_hash(template_path)
+    return context_key(context, backend, source)
+
+def render_invoice_pdf(context, output_dir, backend=None, template_path=TEMPLATE_PATH,
+                       on_stage=None, use_cache=True, cache_root=OUTPUT_DIR):
+    """Produce invoice.pdf in output_dir with the chosen backend.
+
+    Identical requests are served from the render cache in `cache_root` (the
+    archive's output directory). `on_stage(name)` is
+    called before "rendering" and "converting". Returns (pdf_path, odt_path) -
+    odt_path is None for the native backend - or None on failure.
+    """
+    backend = backend or DEFAULT_PDF_BACKEND
+    if backend not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend: {backend}")
+    # A lazy item iterator has no content to cache by, and the ODT path would render it non-streamed
+    if is_streaming_context(context):
+        raise ValueError("Streaming contexts are rendered with render_odt_template(..., stream=True)")
+    on_stage = on_stage or (lambda stage: None)
+
+    pdf_path = os.path.join(output_dir, "invoice.pdf")
+    odt_path = os.path.join(output_dir, "invoice.odt") if backend == "libreoffice" else None
+
+    cache = get_render_cache(cache_root) if use_cache else None
+    if cache is not None:
+        key = render_cache_key(context, backend, template_path)
+        if cache.get(key, pdf_path, odt_path):
+            METRICS.inc("billio_render_cache_total", result="hit")
+            say(f"♻️ Reusing cached render: {key[:12]}")
+            return pdf_path, odt_path
+        METRICS.inc("billio_render_cache_total", result="miss")
+
+    on_stage("rendering")
+    if backend == "native":
+        if not render_native_pdf(context, pdf_path):
+            return None
+    else:
+        if not render_odt_template(template_path, odt_path, context,
+                                   cache_dir=output_cache_dir(cache_root, 'jinja')):
+            return None
+        on_stage("converting")
+        if not convert_to_pdf(odt_path, output_dir):
+            return None
+
+    if cache is not None:
+        cache.put(key, pdf_path, odt_path)
+    return pdf_path, odt_path
+
+def warm_up_converter():
+    """Start the LibreOffice workers ahead of the first conversion."""
+    try:
+        get_conversion_pool().warm_up()
+    except ConversionError as e:
+        print(f"⚠️ LibreOffice workers not started: {e}")
+
+def connect_sqlite(db_path):
+    """Open a SQLite database shared between threads and processes (WAL, autocommit)."""
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def _ledger_connection(output_dir):
+    conn = connect_sqlite(Path(output_dir) / "._invoice_data" / "ledger.sqlite")
+    conn.execute("CREATE TABLE IF NOT EXISTS sequences (year TEXT PRIMARY KEY, last_number INTEGER NOT NULL)")
+    # Numbers of invoices that failed or were cancelled before archiving; handed out again first
+    conn.execute("CREATE TABLE IF NOT EXISTS released (year TEXT NOT NULL, number INTEGER NOT NULL, "
+                 "PRIMARY KEY (year, number))")
+    return conn
+
+def _lowest_released(conn, year_str):
+    row = conn.execute("SELECT MIN(number) FROM released WHERE year = ?", (year_str,)).fetchone()
+    return row[0]
+
+def _highest_archived_number(output_dir, year_str):
+    # Only used once per year to seed the ledger from invoices archived before it existed
     year_folder = Path(output_dir) / year_str
     if not year_folder.exists():
-        return 1
-    pdf_files = list(year_folder.glob("*-2-2_*.pdf"))
-    return len(pdf_files) + 1
\ No newline at end of file
+        return 0
+    numbers = [int(m.group(1)) for m in (INVOICE_FILE_NUMBER_RE.match(f.name) for f in year_folder.glob("*.pdf")) if m]
+    return max(numbers, default=0)
+
+def _last_invoice_number(conn, output_dir, year_str):
+    row = conn.execute("SELECT last_number FROM sequences WHERE year = ?", (year_str,)).fetchone()
+    if row is not None:
+        return row[0]
+    last_number = _highest_archived_number(output_dir, year_str)
+    conn.execute("INSERT INTO sequences (year, last_number) VALUES (?, ?)", (year_str, last_number))
+    return last_number
+
+def _ledger_transaction(output_dir, year_str, update):
+    conn = _ledger_connection(output_dir)
+    try:
+        # IMMEDIATE takes the write lock up front so concurrent generators serialize here
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = update(conn, _last_invoice_number(conn, output_dir, year_str))
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+def get_next_invoice_number(output_dir, year_str):
+    """Next number the ledger would hand out for the year, without reserving it."""
+    return _ledger_transaction(output_dir, year_str, lambda conn, last: _lowest_released(conn, year_str) or last + 1)
+
+def allocate_invoice_number(output_dir, year_str):
+    """Atomically reserve and return the next invoice number for the year.
+
+    A released number (see release_invoice_number) is reused before the sequence moves on.
+    """
+    def allocate(conn, last):
+        released = _lowest_released(conn, year_str)
+        if released is not None:
+            conn.execute("DELETE FROM released WHERE year = ? AND number = ?", (year_str, released))
+            return released
+        conn.execute("UPDATE sequences SET last_number = ? WHERE year = ?", (last + 1, year_str))
+        return last + 1
+    return _ledger_transaction(output_dir, year_str, allocate)
+
+def parse_invoice_sequence(invoice_number):
+    """Sequence part of an invoice number such as '5/2/2', or None if it has none."""
+    head = str(invoice_number).split("/", 1)[0].strip()
+    return int(head) if head.isdigit() else None
+
+def record_invoice_number(output_dir, year_str, number):
+    """Mark a manually entered number as used so the ledger never hands it out again."""
+    def record(conn, last):
+        conn.execute("DELETE FROM released WHERE year = ? AND number = ?", (year_str, number))
+        if number > last:
+            conn.execute("UPDATE sequences SET last_number = ? WHERE year = ?", (number, year_str))
+        return number
+    return _ledger_transaction(output_dir, year_str, record)
+
+def release_invoice_number(output_dir, year_str, invoice_number):
+    """Give back the number of an invoice that failed or was cancelled before it was archived.
+
+    The last number is simply taken back; an earlier one is remembered and
+    allocated again first, so failures don't leave gaps in the year's sequence.
+    A number with an archived PDF is never released.
+    """
+    number = parse_invoice_sequence(invoice_number)
+    if number is None or any((Path(output_dir) / year_str).glob(f"{number}-*.pdf")):
+        return
+    def release(conn, last):
+        if number == last:
+            last -= 1
+            # Earlier released numbers now at the end of the sequence go with it
+            while conn.execute("DELETE FROM released WHERE year = ? AND number = ?", (year_str, last)).rowcount:
+                last -= 1
+            conn.execute("UPDATE sequences SET last_number = ? WHERE year = ?", (last, year_str))
+        elif number < last:
+            conn.execute("INSERT OR IGNORE INTO released VALUES (?, ?)", (year_str, number))
+    _ledger_transaction(output_dir, year_str, release)
+
+def claim_invoice_number(output_dir, year_str, invoice_number=None):
+    """Allocate the next number when none is given, otherwise mark the given one as used."""
+    if not invoice_number:
+        return f"{allocate_invoice_number(output_dir, year_str)}/2/2"
+    sequence = parse_invoice_sequence(invoice_number)
+    if sequence is not None:
+        record_invoice_number(output_dir, year_str, sequence)
+    return invoice_number